@@ -0,0 +1,80 @@
+"""Add device_state and device_event tables.
+
+Revision ID: 16dae1b008a4
+Revises: 193a7961fa93
+Create Date: 2026-10-17 10:12:41.118204
+
+"""
+
+import sqlalchemy as sa
+import sqlalchemy_utils
+import sqlalchemy_utils.types.choice
+# revision identifiers, used by Alembic.
+from alembic import context, op
+
+revision = '16dae1b008a4'
+down_revision = '193a7961fa93'
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    op.create_table('device_state',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('ip', sqlalchemy_utils.types.ip_address.IPAddressType(
+                        length=50), nullable=True),
+                    sa.Column('mac', sa.String(), nullable=True),
+                    sa.Column('vendor', sa.String(), nullable=True),
+                    sa.Column('hostname', sa.String(), nullable=True),
+                    sa.Column('present', sa.Boolean(), nullable=True),
+                    sa.Column('first_seen', sa.DateTime(), nullable=True),
+                    sa.Column('last_seen', sa.DateTime(), nullable=True),
+                    sa.Column('scan_id', sa.Integer(), nullable=True),
+                    sa.ForeignKeyConstraint(['scan_id'], ['scan.id'], ),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('ip', 'mac')
+                    )
+    op.create_table('device_event',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('event', sqlalchemy_utils.types.choice.ChoiceType(
+                        choices=(('appeared', 'Appeared'),
+                                 ('disappeared', 'Disappeared'),
+                                 ('changed', 'Changed'))), nullable=True),
+                    sa.Column('time', sa.DateTime(), nullable=True),
+                    sa.Column('ip', sqlalchemy_utils.types.ip_address.IPAddressType(
+                        length=50), nullable=True),
+                    sa.Column('mac', sa.String(), nullable=True),
+                    sa.Column('changes', sa.JSON(), nullable=True),
+                    sa.Column('state_id', sa.Integer(), nullable=True),
+                    sa.Column('scan_id', sa.Integer(), nullable=True),
+                    sa.ForeignKeyConstraint(['state_id'], ['device_state.id'], ),
+                    sa.ForeignKeyConstraint(['scan_id'], ['scan.id'], ),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    op.drop_table('device_event')
+    op.drop_table('device_state')
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
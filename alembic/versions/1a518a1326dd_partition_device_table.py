@@ -0,0 +1,104 @@
+"""Partition device table by scan start, add indexes.
+
+Revision ID: 1a518a1326dd
+Revises: 16dae1b008a4
+Create Date: 2026-10-17 11:03:52.540117
+
+"""
+
+from datetime import date
+
+from db import partitions
+
+# revision identifiers, used by Alembic.
+from alembic import context, op
+
+revision = '1a518a1326dd'
+down_revision = '16dae1b008a4'
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    op.execute('ALTER TABLE device RENAME TO device_old')
+    op.execute('ALTER SEQUENCE device_id_seq RENAME TO device_old_id_seq')
+    op.execute('''
+        CREATE TABLE device (
+            id BIGSERIAL NOT NULL,
+            ipv4 BOOLEAN,
+            ip VARCHAR(50),
+            mac VARCHAR,
+            vendor VARCHAR,
+            hostname VARCHAR,
+            scan_id INTEGER REFERENCES scan (id),
+            scan_start TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (id, scan_start)
+        ) PARTITION BY RANGE (scan_start)
+    ''')
+    # Older rows go to the default partition, new ones to daily
+    # partitions created by db.partitions.ensure_partitions.
+    op.execute('CREATE TABLE device_default PARTITION OF device DEFAULT')
+    partitions.ensure_partitions(op.get_bind(), date.today())
+    op.create_index('ix_device_scan_id', 'device', ['scan_id'])
+    op.create_index('ix_device_mac', 'device', ['mac'])
+    op.create_index('ix_device_ip', 'device', ['ip'])
+    op.execute('''
+        INSERT INTO device
+            (id, ipv4, ip, mac, vendor, hostname, scan_id, scan_start)
+        SELECT d.id, d.ipv4, d.ip, d.mac, d.vendor, d.hostname, d."Scan",
+               COALESCE(s.start, now())
+        FROM device_old d LEFT JOIN scan s ON s.id = d."Scan"
+    ''')
+    op.execute(
+        "SELECT setval('device_id_seq', COALESCE(MAX(id), 0) + 1, false) "
+        "FROM device"
+    )
+    op.execute('DROP TABLE device_old')
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    op.execute('ALTER TABLE device RENAME TO device_new')
+    op.execute('ALTER SEQUENCE device_id_seq RENAME TO device_new_id_seq')
+    op.execute('''
+        CREATE TABLE device (
+            id SERIAL NOT NULL,
+            ipv4 BOOLEAN,
+            ip VARCHAR(50),
+            mac VARCHAR,
+            vendor VARCHAR,
+            hostname VARCHAR,
+            "Scan" INTEGER REFERENCES scan (id),
+            PRIMARY KEY (id)
+        )
+    ''')
+    op.execute('''
+        INSERT INTO device (id, ipv4, ip, mac, vendor, hostname, "Scan")
+        SELECT id, ipv4, ip, mac, vendor, hostname, scan_id FROM device_new
+    ''')
+    op.execute(
+        "SELECT setval('device_id_seq', COALESCE(MAX(id), 0) + 1, false) "
+        "FROM device"
+    )
+    op.execute('DROP TABLE device_new CASCADE')
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
@@ -0,0 +1,47 @@
+"""Add device (vendor, id) index.
+
+Revision ID: 4c8d2f1a6e39
+Revises: e7a3c5f90b12
+Create Date: 2026-10-17 19:08:31.556720
+
+"""
+
+# revision identifiers, used by Alembic.
+from alembic import context, op
+
+revision = '4c8d2f1a6e39'
+down_revision = 'e7a3c5f90b12'
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    # api.crud.filter_devices(vendor=...) with ORDER BY id DESC LIMIT n:
+    # a backward scan of (vendor, id) in each partition.
+    op.create_index('ix_device_vendor_id', 'device', ['vendor', 'id'])
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    op.drop_index('ix_device_vendor_id', table_name='device')
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
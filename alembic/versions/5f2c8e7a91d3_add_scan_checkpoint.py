@@ -0,0 +1,59 @@
+"""Add scan_checkpoint table.
+
+Revision ID: 5f2c8e7a91d3
+Revises: 1a518a1326dd
+Create Date: 2026-10-17 14:21:07.402613
+
+"""
+
+import sqlalchemy as sa
+# revision identifiers, used by Alembic.
+from alembic import context, op
+
+revision = '5f2c8e7a91d3'
+down_revision = '1a518a1326dd'
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    op.create_table('scan_checkpoint',
+                    sa.Column('scan_id', sa.Integer(), nullable=False),
+                    sa.Column('networks', sa.JSON(), nullable=True),
+                    sa.Column('chunk_size', sa.Integer(), nullable=True),
+                    sa.Column('seed', sa.BigInteger(), nullable=True),
+                    sa.Column('position', sa.BigInteger(), nullable=True),
+                    sa.Column('done', sa.Boolean(), nullable=True),
+                    sa.ForeignKeyConstraint(['scan_id'], ['scan.id'], ),
+                    sa.PrimaryKeyConstraint('scan_id')
+                    )
+    op.create_index(op.f('ix_scan_checkpoint_done'), 'scan_checkpoint',
+                    ['done'], unique=False)
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    op.drop_index(op.f('ix_scan_checkpoint_done'),
+                  table_name='scan_checkpoint')
+    op.drop_table('scan_checkpoint')
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
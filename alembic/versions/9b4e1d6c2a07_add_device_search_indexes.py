@@ -0,0 +1,56 @@
+"""Add device search indexes: inet containment and hostname trigrams.
+
+Revision ID: 9b4e1d6c2a07
+Revises: 5f2c8e7a91d3
+Create Date: 2026-10-17 16:42:18.903154
+
+"""
+
+import sqlalchemy as sa
+# revision identifiers, used by Alembic.
+from alembic import context, op
+
+revision = '9b4e1d6c2a07'
+down_revision = '5f2c8e7a91d3'
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    # ip is VARCHAR: api.crud.filter_devices matches subnets with
+    # CAST(ip AS INET) <<= network, served by an expression GiST index.
+    op.create_index('ix_device_ip_inet', 'device',
+                    [sa.text('(ip::inet) inet_ops')],
+                    postgresql_using='gist')
+    # Hostname substring search (ILIKE '%x%') needs trigrams.
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_device_hostname_trgm', 'device', ['hostname'],
+                    postgresql_using='gin',
+                    postgresql_ops={'hostname': 'gin_trgm_ops'})
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    op.drop_index('ix_device_hostname_trgm', table_name='device')
+    op.drop_index('ix_device_ip_inet', table_name='device')
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
@@ -0,0 +1,58 @@
+"""Add device_presence table.
+
+Revision ID: e7a3c5f90b12
+Revises: 9b4e1d6c2a07
+Create Date: 2026-10-17 17:25:44.118302
+
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+# revision identifiers, used by Alembic.
+from alembic import context, op
+
+revision = 'e7a3c5f90b12'
+down_revision = '9b4e1d6c2a07'
+
+
+def upgrade():
+    schema_upgrades()
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_upgrades()
+
+
+def downgrade():
+    if context.get_x_argument(as_dictionary=True).get('data', None):
+        data_downgrades()
+    schema_downgrades()
+
+
+def schema_upgrades():
+    """schema upgrade migrations go here."""
+    op.create_table('device_presence',
+                    sa.Column('id', sa.BigInteger(), nullable=False),
+                    sa.Column('scan_id', sa.Integer(), nullable=True),
+                    sa.Column('state_ids', postgresql.ARRAY(sa.Integer()),
+                              nullable=True),
+                    sa.ForeignKeyConstraint(['scan_id'], ['scan.id'], ),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_device_presence_scan_id'), 'device_presence',
+                    ['scan_id'], unique=False)
+
+
+def schema_downgrades():
+    """schema downgrade migrations go here."""
+    op.drop_index(op.f('ix_device_presence_scan_id'),
+                  table_name='device_presence')
+    op.drop_table('device_presence')
+
+
+def data_upgrades():
+    """Add any optional data upgrade migrations here!"""
+    pass
+
+
+def data_downgrades():
+    """Add any optional data downgrade migrations here!"""
+    pass
@@ -1,18 +1,115 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
 import sqlalchemy
-from db import models, settings
+from db import export, models, settings
+from db.settings import async_database
 from db.settings import database as db
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import crud
-from .schemas import Scan
+from .schemas import DevicePage, Scan
 
 app = FastAPI()
 
 
+async def get_session():
+    async with async_database.session() as session:
+        yield session
+
+
+class DeviceFilters:
+    def __init__(
+        self,
+        ip: Optional[str] = Query(None, description="IP or CIDR"),
+        mac: Optional[str] = None,
+        vendor: Optional[str] = None,
+        hostname: Optional[str] = Query(None, description="Substring"),
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ):
+        self.values = dict(
+            ip=ip,
+            mac=mac,
+            vendor=vendor,
+            hostname=hostname,
+            since=since,
+            until=until,
+        )
+
+
 @app.get("/scans/")
 def read_scans():
     with db.session() as session:
         scans = crud.get_scans(db=session)
     return scans
+
+
+@app.get("/devices", response_model=DevicePage)
+async def read_devices(
+    filters: DeviceFilters = Depends(),
+    cursor: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_session),
+):
+    try:
+        devices, next_cursor = await crud.get_devices(
+            session, cursor=cursor, limit=limit, **filters.values
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return DevicePage(items=devices, next_cursor=next_cursor)
+
+
+@app.get("/scans/{scan_id}/devices", response_model=DevicePage)
+async def read_scan_devices(
+    scan_id: int,
+    filters: DeviceFilters = Depends(),
+    cursor: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_session),
+):
+    scan_start = await crud.get_scan_start(session, scan_id)
+    if scan_start is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    try:
+        devices, next_cursor = await crud.get_devices(
+            session,
+            scan_id=scan_id,
+            scan_start=scan_start,
+            cursor=cursor,
+            limit=limit,
+            **filters.values,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return DevicePage(items=devices, next_cursor=next_cursor)
+
+
+@app.get("/scans/{scan_id}/export")
+async def export_scan(
+    scan_id: int,
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    gzip: bool = False,
+    session: AsyncSession = Depends(get_session),
+):
+    if await crud.get_scan_start(session, scan_id) is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    filename = f"scan-{scan_id}.{format}"
+    media_type = export.FORMATS[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        export.stream_scan(scan_id, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
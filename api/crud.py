@@ -1,8 +1,91 @@
+from datetime import datetime
+from ipaddress import ip_address, ip_network
+from typing import List, Optional, Tuple
+
+import sqlalchemy as sa
 from db import models
+from sqlalchemy.dialects.postgresql import INET
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from . import schemas
 
+_LIKE_ESCAPE = str.maketrans({"/": "//", "%": "/%", "_": "/_"})
+
 
 def get_scans(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Scan).offset(skip).limit(limit).all()
+
+
+async def get_scan_start(db: AsyncSession, scan_id: int) -> Optional[datetime]:
+    return await db.scalar(
+        sa.select(models.Scan.start).where(models.Scan.id == scan_id)
+    )
+
+
+def filter_devices(
+    query: sa.sql.Select,
+    ip: str = None,
+    mac: str = None,
+    vendor: str = None,
+    hostname: str = None,
+    since: datetime = None,
+    until: datetime = None,
+) -> sa.sql.Select:
+    """
+    Фильтры выборки устройств.
+        ip - адрес или подсеть в нотации CIDR (индекс ix_device_ip_inet),
+        hostname - подстрока (индекс ix_device_hostname_trgm), vendor -
+        точное совпадение (индекс ix_device_vendor_id).
+        since и until ограничивают время начала сканирования, что
+        позволяет планировщику отбросить лишние секции device.
+    """
+    device = models.Device
+    if ip:
+        if "/" in ip:
+            network = str(ip_network(ip, strict=False))
+            query = query.where(
+                sa.cast(device.ip, INET).op("<<=")(sa.cast(network, INET))
+            )
+        else:
+            query = query.where(device.ip == str(ip_address(ip)))
+    if mac:
+        query = query.where(device.mac == mac.lower())
+    if vendor:
+        query = query.where(device.vendor == vendor)
+    if hostname:
+        pattern = hostname.translate(_LIKE_ESCAPE)
+        query = query.where(device.hostname.ilike(f"%{pattern}%", escape="/"))
+    if since:
+        query = query.where(device.scan_start >= since)
+    if until:
+        query = query.where(device.scan_start < until)
+    return query
+
+
+async def get_devices(
+    db: AsyncSession,
+    scan_id: int = None,
+    scan_start: datetime = None,
+    cursor: int = None,
+    limit: int = 100,
+    **filters,
+) -> Tuple[List[models.Device], Optional[int]]:
+    """
+    Страница устройств с постраничным выводом по ключу (keyset).
+        Устройства упорядочены по убыванию id, cursor - id последнего
+        устройства предыдущей страницы. Возвращает устройства и курсор
+        следующей страницы (None, если страница последняя).
+    """
+    device = models.Device
+    query = filter_devices(sa.select(device), **filters)
+    if scan_id is not None:
+        query = query.where(device.scan_id == scan_id)
+    if scan_start is not None:
+        query = query.where(device.scan_start == scan_start)
+    if cursor is not None:
+        query = query.where(device.id < cursor)
+    query = query.order_by(device.id.desc()).limit(limit + 1)
+    devices = (await db.execute(query)).scalars().all()
+    next_cursor = devices[limit - 1].id if len(devices) > limit else None
+    return devices[:limit], next_cursor
@@ -1,5 +1,6 @@
 from datetime import datetime
 from enum import Enum
+from typing import List, Optional
 from ipaddress import (IPv4Address, IPv4Interface, IPv4Network, ip_network,
                        summarize_address_range)
 
@@ -21,6 +22,15 @@ class Device(BaseModel):
     vendor: str
     hostname: str
     scan_id: int
+    scan_start: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class DevicePage(BaseModel):
+    items: List[Device]
+    next_cursor: Optional[int]
 
 
 class Scan(BaseModel):
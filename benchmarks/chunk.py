@@ -0,0 +1,85 @@
+"""
+Бенчмарк представления порции устройств.
+    python -m benchmarks.chunk [--rows 100000]
+Сравнивает прежний список словарей (utils.to_lists_of_dicts) с
+chunk.DeviceChunk: пиковую память и число выделенных блоков (tracemalloc),
+время сборки порции и получения строк для записи в БД.
+"""
+import argparse
+import time
+import tracemalloc
+
+from scanner.chunk import DeviceChunk
+from scanner.ranges import format_address
+from utils import utils
+
+
+def columns(rows: int, vendors: list) -> dict:
+    return {
+        "ip": [0x0A000000 + i for i in range(rows)],
+        "mac": [0xAABBCC000000 + i for i in range(rows)],
+        "hostname": [f"host-{i}.example.com" for i in range(rows)],
+        "vendor": [vendors[i % len(vendors)] for i in range(rows)],
+    }
+
+
+def build_dicts(data: dict) -> list:
+    return utils.to_lists_of_dicts(
+        ip=list(map(format_address, data["ip"])),
+        mac=[
+            ":".join(f"{mac:012x}"[i : i + 2] for i in range(0, 12, 2))
+            for mac in data["mac"]
+        ],
+        hostname=data["hostname"],
+        vendor=data["vendor"],
+    )
+
+
+def build_chunk(data: dict) -> DeviceChunk:
+    return DeviceChunk(
+        data["ip"], data["mac"], data["hostname"], data["vendor"]
+    )
+
+
+def dict_rows(devices: list) -> list:
+    return [
+        (device["ip"], device["mac"], device["vendor"], device["hostname"])
+        for device in devices
+    ]
+
+
+def measure(name: str, build, rows, data: dict):
+    tracemalloc.start()
+    started = time.perf_counter()
+    devices = build(data)
+    built = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    blocks = sum(
+        stat.count
+        for stat in tracemalloc.take_snapshot().statistics("filename")
+    )
+    tracemalloc.stop()
+    started = time.perf_counter()
+    rows(devices)
+    read = time.perf_counter() - started
+    print(
+        f"{name}: {current / 2**20:.1f} MiB held, peak "
+        f"{peak / 2**20:.1f} MiB, {blocks} blocks, build "
+        f"{built * 1000:.1f} ms, rows {read * 1000:.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--vendors", type=int, default=30_000)
+    args = parser.parse_args()
+
+    vendors = [f"Vendor {i}" for i in range(args.vendors)]
+    data = columns(args.rows, vendors)
+    measure("list of dicts", build_dicts, dict_rows, data)
+    measure("DeviceChunk", build_chunk, lambda chunk: list(chunk.rows()), data)
+
+
+if __name__ == "__main__":
+    main()
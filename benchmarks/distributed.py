@@ -0,0 +1,94 @@
+"""
+Бенчмарк распределенного сканирования (scanner.distributed).
+    python -m benchmarks.distributed [--subs 10.0.0.0/20] [--agents 1 2 4]
+Координатор и агенты работают в одном процессе через брокер memory://,
+каждый агент - в своем потоке со своим циклом событий и имитируемой сетью
+(benchmarks.simulation), запись идет в benchmarks.scan.MemoryWriter.
+Показывает, как скорость растет с числом агентов.
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from benchmarks.scan import MemoryWriter, report
+from benchmarks.simulation import SimulatedNetwork
+from scanner.distributed import Coordinator, ScanAgent
+from scanner.scanner import Subnets
+from scanner_run import ascan_and_commit
+
+BROKER_URL = "memory://"
+# memory:// опрашивает очереди раз в polling_interval секунд.
+TRANSPORT_OPTIONS = {"polling_interval": 0.01}
+
+
+def start_agents(args, networks, count: int) -> list:
+    threads = []
+    for number in range(count):
+        network = SimulatedNetwork(
+            networks,
+            density=args.density,
+            rtt=args.rtt,
+            dns_latency=args.dns_latency,
+            seed=0,
+        )
+        agent = ScanAgent(
+            BROKER_URL,
+            name=f"agent-{number}",
+            transport_options=TRANSPORT_OPTIONS,
+            **network.backends(
+                timeout=args.timeout, concurrency=args.concurrency
+            ),
+        )
+        thread = threading.Thread(
+            target=agent.run, kwargs={"idle_timeout": 1}, daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+async def bench(args, networks, count: int):
+    coordinator = Coordinator(
+        BROKER_URL,
+        unit_chunks=args.unit_chunks,
+        timeout=30,
+        transport_options=TRANSPORT_OPTIONS,
+        networks=networks,
+        chunk_size=args.chunk_size,
+    )
+    writer = MemoryWriter()
+    threads = start_agents(args, networks, count)
+    started = time.perf_counter()
+    await ascan_and_commit(devices=coordinator, writer=writer)
+    elapsed = time.perf_counter() - started
+    report(
+        f"{count} agents",
+        sum(item.num_addresses for item in networks),
+        writer.rows,
+        elapsed,
+    )
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subs", nargs="+", default=["10.0.0.0/20"])
+    parser.add_argument("--agents", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--density", type=float, default=0.1)
+    parser.add_argument("--rtt", type=float, default=0.002)
+    parser.add_argument("--dns-latency", type=float, default=0.005)
+    parser.add_argument("--timeout", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=300)
+    parser.add_argument("--unit-chunks", type=int, default=2)
+    args = parser.parse_args()
+
+    networks = Subnets.get_ranges_from_str(args.subs)
+    for count in args.agents:
+        asyncio.run(bench(args, networks, count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Бенчмарк записи устройств в таблицу device путями db.writer.ScanWriter:
+ORM (запасной путь) и COPY.
+    python -m benchmarks.ingest [--rows 100000]
+Нужна настроенная БД (db/.env). Записанные устройства и сканирование
+удаляются после замера.
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, datetime
+
+import sqlalchemy as sa
+
+from db import models, partitions
+from db.settings import async_database
+from db.writer import ScanWriter
+from scanner.chunk import DeviceChunk
+
+
+def synthetic_devices(rows: int) -> DeviceChunk:
+    return DeviceChunk(
+        ips=(0x0A000000 + i for i in range(rows)),
+        macs=(0xAABBCC000000 + i for i in range(rows)),
+        hostnames=[f"host-{i}.example.com" for i in range(rows)],
+        vendors=["Acme Corp"] * rows,
+    )
+
+
+async def create_writer() -> ScanWriter:
+    writer = ScanWriter(database=async_database)
+    writer.start_time = datetime.now()
+    async with async_database.engine.begin() as conn:
+        await conn.run_sync(partitions.ensure_partitions, date.today())
+        result = await conn.execute(
+            sa.insert(models.Scan)
+            .values(start=writer.start_time, starter="manual")
+            .returning(models.Scan.id)
+        )
+        writer.scan_id = result.scalar_one()
+    return writer
+
+
+async def measure(write, devices: DeviceChunk) -> float:
+    started = time.perf_counter()
+    await write(devices)
+    return time.perf_counter() - started
+
+
+async def cleanup(writer: ScanWriter):
+    async with async_database.engine.begin() as conn:
+        await conn.execute(
+            sa.delete(models.Device).where(
+                models.Device.scan_id == writer.scan_id
+            )
+        )
+        await conn.execute(
+            sa.delete(models.Scan).where(models.Scan.id == writer.scan_id)
+        )
+
+
+async def bench(rows: int):
+    devices = synthetic_devices(rows)
+    writer = await create_writer()
+    try:
+        for name, write in (
+            ("orm", writer._orm_chunk),
+            ("copy", writer._copy_chunk),
+        ):
+            elapsed = await measure(write, devices)
+            print(
+                f"{name}: {rows} rows in {elapsed:.3f} s, "
+                f"{rows / elapsed:,.0f} rows/s"
+            )
+    finally:
+        await cleanup(writer)
+        await async_database.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    asyncio.run(bench(args.rows))
+
+
+if __name__ == "__main__":
+    main()
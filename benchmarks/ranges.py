@@ -0,0 +1,78 @@
+"""
+Бенчмарк нормализации диапазонов.
+    python -m benchmarks.ranges [--count 5000]
+Сравнивает RangeSet с прежним попарным удалением вложенных подсетей.
+"""
+import argparse
+import itertools
+import random
+import time
+from ipaddress import IPv4Network
+
+from scanner.ranges import HostRange, RangeSet
+
+
+def legacy_remove_subnets(ranges):
+    networks_combinations = itertools.combinations(ranges, 2)
+    for combination in networks_combinations:
+        if combination[0].subnet_of(combination[1]):
+            try:
+                ranges.remove(combination[0])
+            except ValueError:
+                pass
+        elif combination[0].supernet_of(combination[1]):
+            try:
+                ranges.remove(combination[1])
+            except ValueError:
+                pass
+    return ranges
+
+
+def random_networks(count: int) -> list:
+    rnd = random.Random(0)
+    networks = []
+    for _ in range(count):
+        prefix = rnd.randint(16, 28)
+        address = rnd.getrandbits(32) & ~((1 << (32 - prefix)) - 1)
+        networks.append(IPv4Network((address, prefix)))
+    return networks
+
+
+def measure(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--legacy-limit", type=int, default=2000)
+    args = parser.parse_args()
+
+    networks = random_networks(args.count)
+    host_ranges = [HostRange.from_network(network) for network in networks]
+    excluded = [
+        HostRange.from_network(network, hosts_only=False)
+        for network in random_networks(args.count // 10)
+    ]
+
+    elapsed = measure(RangeSet, host_ranges)
+    print(f"RangeSet merge: {args.count} ranges in {elapsed * 1000:.1f} ms")
+    ranges = RangeSet(host_ranges)
+    elapsed = measure(ranges.subtract, excluded)
+    print(
+        f"RangeSet subtract: {len(excluded)} ranges in "
+        f"{elapsed * 1000:.1f} ms"
+    )
+
+    count = min(args.count, args.legacy_limit)
+    elapsed = measure(legacy_remove_subnets, networks[:count])
+    print(
+        f"legacy _remove_subnets: {count} networks in "
+        f"{elapsed * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Бенчмарк сканирования на имитируемой сети (benchmarks.simulation).
+    python -m benchmarks.scan [--subs 10.0.0.0/20] [--density 0.1]
+        [--rtt 0.002] [--loss 0.01] [--dns-latency 0.005] [--database]
+        [--memory-budget 64] [--probe-mode arp] [--icmp-silent 0.2]
+Измеряет Devices и scan_and_commit: адреса/с, устройства/с и время
+обработки порции каждым этапом, для scan_and_commit - также ожидание
+бюджета памяти и пиковый RSS. Сеть и системные вызовы не нужны; без
+--database запись идет в MemoryWriter вместо БД. При --probe-mode arp
+подсети --subs считаются on-link и опрашиваются запросами ARP.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from ipaddress import IPv4Interface
+from typing import List
+
+from benchmarks.simulation import SimulatedNetwork
+from db.ingest import device_records
+from db.writer import ScanWriter
+from log_settings import context
+from scanner.arp import Link
+from scanner.budget import MemoryBudget, peak_rss
+from scanner.chunk import DeviceChunk
+from scanner.scanner import Devices, Subnets
+from scanner_run import ascan_and_commit
+
+
+class MemoryWriter(ScanWriter):
+    """
+    Замена БД для ScanWriter: очередь и задача записи те же, порции
+    преобразуются в записи как для COPY, запись имитируется задержкой
+    row_latency на строку.
+    """
+
+    def __init__(self, row_latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.row_latency = row_latency
+        self.latencies = []
+
+    async def start(self) -> int:
+        self.start_time = datetime.now()
+        self.scan_id = 1
+        context.scan_id.set(self.scan_id)
+        self._task = asyncio.ensure_future(self._run())
+        return self.scan_id
+
+    async def _write_chunk(self, devices: DeviceChunk):
+        started = time.perf_counter()
+        list(device_records(devices, self.scan_id, self.start_time))
+        await asyncio.sleep(self.row_latency * len(devices))
+        self.latencies.append(time.perf_counter() - started)
+
+
+def percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def report(name: str, addresses: int, devices: int, elapsed: float):
+    print(
+        f"{name}: {addresses} addresses, {devices} devices in "
+        f"{elapsed:.3f} s, {addresses / elapsed:,.0f} addresses/s, "
+        f"{devices / elapsed:,.0f} devices/s"
+    )
+
+
+def report_latencies(latencies: dict):
+    for stage, values in latencies.items():
+        if not values:
+            continue
+        print(
+            f"  {stage:>8}: {len(values)} chunks, "
+            f"mean {sum(values) / len(values) * 1000:.1f} ms, "
+            f"p95 {percentile(values, 0.95) * 1000:.1f} ms, "
+            f"max {max(values) * 1000:.1f} ms"
+        )
+
+
+def make_devices(args, networks, budget: MemoryBudget = None) -> Devices:
+    network = SimulatedNetwork(
+        networks,
+        density=args.density,
+        rtt=args.rtt,
+        loss=args.loss,
+        dns_latency=args.dns_latency,
+        arp_miss=args.arp_miss,
+        icmp_silent=args.icmp_silent,
+        seed=0,
+    )
+    backends = network.backends(
+        timeout=args.timeout, concurrency=args.concurrency
+    )
+    if args.probe_mode == "arp":
+        backends["arp_engine"] = network.arp_engine(
+            [Link("sim0", IPv4Interface(sub)) for sub in args.subs],
+            fallback=backends["ping_engine"],
+            timeout=args.timeout,
+        )
+    return Devices(
+        networks=networks,
+        chunk_size=args.chunk_size,
+        budget=budget,
+        **backends,
+    )
+
+
+async def bench_devices(args, networks):
+    devices = make_devices(args, networks)
+    found = 0
+    started = time.perf_counter()
+    async for chunk in devices:
+        found += len(chunk)
+    report(
+        "devices",
+        sum(item.num_addresses for item in networks),
+        found,
+        time.perf_counter() - started,
+    )
+    report_latencies(devices.latencies)
+
+
+async def bench_commit(args, networks):
+    budget = None
+    if args.memory_budget:
+        budget = MemoryBudget(int(args.memory_budget * 2**20))
+    devices = make_devices(args, networks, budget)
+    if args.database:
+        writer = ScanWriter()
+    else:
+        writer = MemoryWriter(args.row_latency)
+    started = time.perf_counter()
+    await ascan_and_commit(devices=devices, writer=writer, budget=budget)
+    elapsed = time.perf_counter() - started
+    latencies = dict(devices.latencies)
+    if not args.database:
+        latencies["db"] = writer.latencies
+    report(
+        "scan_and_commit",
+        sum(item.num_addresses for item in networks),
+        writer.rows,
+        elapsed,
+    )
+    report_latencies(latencies)
+    if budget is not None:
+        print(
+            f"  budget: {budget.devices} devices, peak {budget.peak} in "
+            f"flight, waited {budget.waited:.3f} s"
+        )
+    print(f"  peak RSS: {peak_rss() / 2**20:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subs", nargs="+", default=["10.0.0.0/20"])
+    parser.add_argument("--density", type=float, default=0.1)
+    parser.add_argument("--rtt", type=float, default=0.002)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--dns-latency", type=float, default=0.005)
+    parser.add_argument("--arp-miss", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=300)
+    parser.add_argument("--row-latency", type=float, default=0.00001)
+    parser.add_argument("--database", action="store_true")
+    parser.add_argument("--memory-budget", type=float, default=0)
+    parser.add_argument("--probe-mode", default="icmp")
+    parser.add_argument("--icmp-silent", type=float, default=0.0)
+    args = parser.parse_args()
+
+    networks = Subnets.get_ranges_from_str(args.subs)
+    asyncio.run(bench_devices(args, networks))
+    asyncio.run(bench_commit(args, networks))
+
+
+if __name__ == "__main__":
+    main()
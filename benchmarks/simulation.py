@@ -0,0 +1,297 @@
+"""
+Имитация сети для запуска сканера без сети и системных вызовов.
+    Подменяет icmp-опрос (PingEngine.ping_func), arp-кэш
+    (neighbors.NeighborTable), dns-резолвер, индекс вендоров и сокет
+    AF_PACKET опроса ARP (ReplaySocket, в том числе с пакетами, записанными
+    tcpdump).
+"""
+import asyncio
+import random
+import socket
+import struct
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple
+
+from aiodns.error import DNSError
+
+from benchmarks.vendors import synthetic_index
+from scanner.arp import (
+    ARP_REPLY,
+    ARP_REQUEST,
+    ArpEngine,
+    Link,
+    build_frame,
+    parse_frame,
+)
+from scanner.dns_cache import HostnameCache
+from scanner.neighbors import NeighborTable
+from scanner.ping import PingEngine
+from scanner.ranges import HostRange, format_address, parse_address
+from scanner.vendors import OUIIndex
+
+# Код ARES_ENOTFOUND для отсутствующей записи.
+_NOT_FOUND = 4
+# MAC-адрес сканера в имитируемой сети.
+SCANNER_MAC = bytes.fromhex("020000000001")
+_PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": "<",
+    b"\xa1\xb2\xc3\xd4": ">",
+    b"\x4d\x3c\xb2\xa1": "<",
+    b"\xa1\xb2\x3c\x4d": ">",
+}
+
+
+def read_pcap(path: str) -> Iterator[bytes]:
+    """
+    Кадры из файла в формате pcap (tcpdump -w).
+    """
+    with open(path, "rb") as f:
+        header = f.read(24)
+        order = _PCAP_MAGIC.get(header[:4])
+        if order is None:
+            raise ValueError(f"{path} is not a pcap file")
+        record = struct.Struct(order + "IIII")
+        while True:
+            data = f.read(record.size)
+            if len(data) < record.size:
+                return
+            length = record.unpack(data)[2]
+            yield f.read(length)
+
+
+class ReplaySocket:
+    """
+    Сокет с интерфейсом arp.LinkSocket, отвечающий на запросы ARP
+    заранее записанными кадрами.
+        Ответ на запрос адреса берется из replies (адрес -> кадр) и
+        становится доступен для чтения через socketpair, поэтому работает
+        с loop.add_reader, как настоящий сокет.
+    Пример
+        sock = ReplaySocket.from_pcap("arp.pcap")
+        engine = ArpEngine(links, socket_factory=lambda name: sock)
+    """
+
+    def __init__(
+        self,
+        replies: Dict[int, bytes],
+        mac: bytes = SCANNER_MAC,
+        loss: float = 0.0,
+        seed: int = 0,
+    ):
+        self.replies = replies
+        self.mac = mac
+        self.loss = loss
+        self.sent = 0
+        self._random = random.Random(seed)
+        self._reader, self._writer = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_DGRAM
+        )
+        self._reader.setblocking(False)
+
+    @classmethod
+    def from_pcap(cls, path: str, **kwargs) -> "ReplaySocket":
+        replies = {}
+        for frame in read_pcap(path):
+            packet = parse_frame(frame)
+            if packet is not None and packet.operation == ARP_REPLY:
+                replies[packet.sender_ip] = frame
+        return cls(replies, **kwargs)
+
+    def fileno(self) -> int:
+        return self._reader.fileno()
+
+    def send(self, frame: bytes) -> int:
+        self.sent += 1
+        packet = parse_frame(frame)
+        if packet is not None and packet.operation == ARP_REQUEST:
+            reply = self.replies.get(packet.target_ip)
+            if reply is not None and self._random.random() >= self.loss:
+                self._writer.send(reply)
+        return len(frame)
+
+    def recv(self, size: int) -> bytes:
+        return self._reader.recv(size)
+
+    def close(self):
+        self._reader.close()
+        self._writer.close()
+
+
+class SimulatedHost(NamedTuple):
+    """
+    Результат опроса с интерфейсом icmplib.Host.
+    """
+
+    address: str
+    is_alive: bool
+    avg_rtt: float
+
+
+class PTRAnswer(NamedTuple):
+    name: str
+    ttl: int
+
+
+class SimulatedNetwork:
+    """
+    Сеть с заданной плотностью хостов, RTT, потерями и задержкой dns.
+    Параметры
+        networks - диапазоны адресов (ranges.HostRange).
+        density - доля активных адресов.
+        rtt - средний RTT, секунды (разброс от 0.5 до 1.5 rtt).
+        loss - вероятность потери ответа на один запрос.
+        dns_latency - задержка ответа dns, секунды.
+        dns_ratio - доля активных адресов с PTR-записью.
+        arp_miss - доля активных адресов без записи в arp-кэше.
+        vendors - число префиксов в индексе вендоров.
+        vendor_miss - доля mac-адресов с неизвестным префиксом.
+        icmp_silent - доля активных адресов, не отвечающих на icmp (но
+            отвечающих на ARP).
+    Пример
+        network = SimulatedNetwork(ranges, density=0.1, rtt=0.002)
+        devices = Devices(networks=ranges, **network.backends())
+    """
+
+    def __init__(
+        self,
+        networks: Iterable[HostRange],
+        density: float = 0.1,
+        rtt: float = 0.002,
+        loss: float = 0.0,
+        dns_latency: float = 0.005,
+        dns_ratio: float = 0.7,
+        arp_miss: float = 0.0,
+        vendors: int = 30_000,
+        vendor_miss: float = 0.05,
+        icmp_silent: float = 0.0,
+        seed: int = 0,
+    ):
+        self.rtt = rtt
+        self.loss = loss
+        self.dns_latency = dns_latency
+        self.vendors = vendors
+        self._random = random.Random(seed)
+        self.alive = set()
+        for first, last in networks:
+            count = last - first + 1
+            self.alive.update(
+                self._random.sample(
+                    range(first, last + 1), round(count * density)
+                )
+            )
+        alive = sorted(self.alive)
+        self.named = set(
+            self._random.sample(alive, round(len(alive) * dns_ratio))
+        )
+        self.unlisted = set(
+            self._random.sample(alive, round(len(alive) * arp_miss))
+        )
+        self.unknown = set(
+            self._random.sample(alive, round(len(alive) * vendor_miss))
+        )
+        self.silent = set(
+            self._random.sample(alive, round(len(alive) * icmp_silent))
+        )
+        self.probes = 0
+        self.queries = 0
+
+    def mac(self, address: int) -> str:
+        if address in self.unknown:
+            prefix = self.vendors + address % self.vendors
+        else:
+            prefix = address % self.vendors
+        value = prefix << 24 | address & 0xFFFFFF
+        return ":".join(f"{value:012x}"[i : i + 2] for i in range(0, 12, 2))
+
+    async def ping(
+        self,
+        address: str,
+        count: int = 1,
+        timeout: float = 1,
+        privileged: bool = True,
+    ) -> SimulatedHost:
+        self.probes += 1
+        number = parse_address(address)
+        rtt = self.rtt * (0.5 + self._random.random())
+        if (
+            number not in self.alive
+            or number in self.silent
+            or rtt > timeout
+            or self._random.random() < self.loss
+        ):
+            await asyncio.sleep(timeout)
+            return SimulatedHost(address, False, 0.0)
+        await asyncio.sleep(rtt)
+        return SimulatedHost(address, True, rtt * 1000)
+
+    async def query(self, name: str, query_type: str) -> PTRAnswer:
+        """
+        Ответ на PTR-запрос с интерфейсом aiodns.DNSResolver.query.
+        """
+        self.queries += 1
+        await asyncio.sleep(self.dns_latency)
+        number = parse_address(".".join(reversed(name.split(".")[:4])))
+        if number not in self.named:
+            raise DNSError(_NOT_FOUND, "Domain name not found")
+        return PTRAnswer(f"host-{number:08x}.example.com", 3600)
+
+    def neighbor_table(self) -> NeighborTable:
+        return SimulatedNeighborTable(self)
+
+    def vendor_index(self) -> OUIIndex:
+        return synthetic_index(self.vendors)
+
+    def arp_replies(self) -> Dict[int, bytes]:
+        """
+        Ответы ARP всех активных адресов на запросы сканера (SCANNER_MAC).
+        """
+        return {
+            address: build_frame(
+                ARP_REPLY,
+                bytes.fromhex(self.mac(address).replace(":", "")),
+                address,
+                0,
+                target_mac=SCANNER_MAC,
+                destination=SCANNER_MAC,
+            )
+            for address in self.alive
+        }
+
+    def arp_engine(self, links: List[Link], **options) -> ArpEngine:
+        """
+        Движок опроса ARP для сетей links с сокетом ReplaySocket.
+            Параметры options как у ArpEngine (fallback, rate, timeout).
+        """
+        sock = ReplaySocket(self.arp_replies(), loss=self.loss)
+        return ArpEngine(links, socket_factory=lambda name: sock, **options)
+
+    def backends(self, **ping_options) -> dict:
+        """
+        Параметры Devices, подменяющие все внешние вызовы.
+            Кэш имен хостов пустой и не связан с файлом.
+        """
+        return dict(
+            dns_cache=HostnameCache(),
+            ping_engine=PingEngine(ping_func=self.ping, **ping_options),
+            neighbors=self.neighbor_table(),
+            resolver=self,
+            vendor_index=self.vendor_index(),
+        )
+
+
+class SimulatedNeighborTable(NeighborTable):
+    """
+    Arp-кэш имитируемой сети, без чтения файла и ioctl.
+    """
+
+    def __init__(self, network: SimulatedNetwork, max_age: float = 60):
+        super().__init__(max_age=max_age, fallback=False)
+        self.network = network
+
+    def refresh(self):
+        self._macs = {
+            format_address(address): self.network.mac(address)
+            for address in self.network.alive
+            if address not in self.network.unlisted
+        }
+        self._updated = time.monotonic()
@@ -0,0 +1,56 @@
+"""
+Микробенчмарк поиска вендоров по индексу OUI.
+    python -m benchmarks.vendors [--file ~/.cache/mac-vendors.txt]
+Без --file индекс строится из синтетических префиксов.
+"""
+import argparse
+import random
+import time
+
+from scanner.vendors import OUIIndex
+
+
+def synthetic_index(size: int) -> OUIIndex:
+    lines = (b"%06X:Vendor %d" % (prefix, prefix) for prefix in range(size))
+    return OUIIndex.from_lines(lines)
+
+
+def random_macs(count: int, prefixes: int) -> list:
+    rnd = random.Random(0)
+    macs = []
+    for _ in range(count):
+        value = (rnd.randrange(prefixes * 2) << 24) | rnd.getrandbits(24)
+        macs.append(
+            ":".join(f"{value:012x}"[i : i + 2] for i in range(0, 12, 2))
+        )
+    return macs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", default=None)
+    parser.add_argument("--count", type=int, default=200_000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.file:
+        index = OUIIndex.from_file(args.file)
+    else:
+        index = synthetic_index(30_000)
+    print(
+        f"index: {len(index)} prefixes, built in "
+        f"{time.perf_counter() - started:.3f} s"
+    )
+
+    macs = random_macs(args.count, 30_000)
+    started = time.perf_counter()
+    index.lookup_many(macs)
+    elapsed = time.perf_counter() - started
+    print(
+        f"lookups: {args.count} in {elapsed:.3f} s, "
+        f"{args.count / elapsed:,.0f} lookups/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
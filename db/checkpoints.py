@@ -0,0 +1,44 @@
+from datetime import datetime
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection, Row
+
+from .models import DevicePresence, Scan, ScanCheckpoint
+
+
+def unfinished(conn: Connection, scan_id: int = None) -> Optional[Row]:
+    """
+    Точка продолжения незавершенного сканирования (последнего или scan_id)
+    вместе с временем его начала (start).
+    """
+    query = (
+        sa.select(*ScanCheckpoint.__table__.columns, Scan.start)
+        .join(Scan, Scan.id == ScanCheckpoint.scan_id)
+        .where(ScanCheckpoint.done.is_(False))
+        .order_by(ScanCheckpoint.scan_id.desc())
+        .limit(1)
+    )
+    if scan_id is not None:
+        query = query.where(ScanCheckpoint.scan_id == scan_id)
+    return conn.execute(query).first()
+
+
+def drop_presence(
+    conn: Connection, scan_id: int = None, before: datetime = None
+) -> int:
+    """
+    Удаление строк device_presence завершенного сканирования scan_id или
+    сканирований, начатых до before (незавершенные, которые уже не будут
+    продолжены). Возвращает число удаленных строк.
+    """
+    query = sa.delete(DevicePresence)
+    if scan_id is not None:
+        query = query.where(DevicePresence.scan_id == scan_id)
+    if before is not None:
+        query = query.where(
+            DevicePresence.scan_id.in_(
+                sa.select(Scan.id).where(Scan.start < before)
+            )
+        )
+    return conn.execute(query).rowcount
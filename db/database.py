@@ -1,11 +1,15 @@
-from contextlib import contextmanager
+import logging
+from contextlib import asynccontextmanager, contextmanager
 
 from sqlalchemy import create_engine, orm
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session
 
 Base = declarative_base()
 
+logger = logging.getLogger("runner")
+
 
 class Database:
     def __init__(self, db_url: str):
@@ -20,8 +24,32 @@ class Database:
         session: Session = self.session_factory()
         try:
             yield session
-        except Exception as e:
-            print('Session rollback because of exception: %s', e)
+        except Exception:
+            logger.exception('Session rollback because of exception')
             session.rollback()
         finally:
             session.close()
+
+
+class AsyncDatabase:
+    def __init__(self, db_url: str, pool_size: int = 5,
+                 max_overflow: int = 10):
+        self.db_url = db_url
+        self.engine = create_async_engine(
+            self.db_url, pool_size=pool_size, max_overflow=max_overflow
+        )
+        self.session_factory = orm.sessionmaker(
+            bind=self.engine, class_=AsyncSession, expire_on_commit=False
+        )
+
+    @asynccontextmanager
+    async def session(self):
+        session: AsyncSession = self.session_factory()
+        try:
+            yield session
+        except Exception:
+            logger.exception('Session rollback because of exception')
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
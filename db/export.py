@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Iterable
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import models
+from .database import AsyncDatabase
+from .settings import async_database
+
+FIELDS = ["id", "ip", "mac", "vendor", "hostname", "scan_id", "scan_start"]
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _ndjson(rows: Iterable) -> str:
+    return "".join(
+        json.dumps(dict(zip(FIELDS, row)), default=str) + "\n" for row in rows
+    )
+
+
+def _csv(rows: Iterable) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+_FORMATTERS = {"ndjson": _ndjson, "csv": _csv}
+
+
+async def _formatted(
+    conn: AsyncConnection, scan_id: int, fmt: str, batch_size: int
+) -> AsyncIterator[str]:
+    formatter = _FORMATTERS[fmt]
+    if fmt == "csv":
+        yield formatter([FIELDS])
+    device = models.Device
+    scan_start = await conn.scalar(
+        sa.select(models.Scan.start).where(models.Scan.id == scan_id)
+    )
+    query = (
+        sa.select(*(getattr(device, field) for field in FIELDS))
+        .where(device.scan_id == scan_id, device.scan_start == scan_start)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await conn.stream(query)
+    async for rows in result.partitions(batch_size):
+        yield formatter(rows)
+
+
+async def stream_scan(
+    scan_id: int,
+    fmt: str = "ndjson",
+    gzip: bool = False,
+    batch_size: int = 5000,
+    database: AsyncDatabase = async_database,
+) -> AsyncIterator[bytes]:
+    """
+    Потоковая выгрузка устройств сканирования в NDJSON или CSV.
+        Строки читаются серверным курсором порциями по batch_size, каждая
+        порция сразу форматируется и отдается, поэтому память не зависит от
+        размера сканирования. При gzip=True поток сжимается на лету.
+    Пример
+        async for data in stream_scan(42, "csv", gzip=True):
+            f.write(data)
+    """
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    async with database.engine.connect() as conn:
+        async for text in _formatted(conn, scan_id, fmt, batch_size):
+            data = text.encode()
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    if compressor is not None:
+        yield compressor.flush()
@@ -0,0 +1,20 @@
+from datetime import datetime
+from typing import List
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection
+
+from .models import Device, DeviceState
+
+
+def recent_addresses(conn: Connection, since: datetime) -> List[int]:
+    """
+    Адреса, найденные в сканированиях начиная с since, и присутствующие
+    устройства инкрементального учета. Используется для начального
+    заполнения scanner.hotset.HotSet.
+    """
+    query = sa.union(
+        sa.select(Device.ip).where(Device.scan_start >= since),
+        sa.select(DeviceState.ip).where(DeviceState.present.is_(True)),
+    )
+    return [int(ip) for ip, in conn.execute(query) if ip is not None]
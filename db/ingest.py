@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import TYPE_CHECKING, List
+
+import asyncpg
+
+from .settings import ASYNCPG_DSN
+
+if TYPE_CHECKING:
+    from scanner.chunk import DeviceChunk
+
+DEVICE_COLUMNS = [
+    "ipv4",
+    "ip",
+    "mac",
+    "vendor",
+    "hostname",
+    "scan_id",
+    "scan_start",
+]
+
+
+def device_records(
+    devices: "DeviceChunk", scan_id: int, scan_start: datetime
+) -> List[tuple]:
+    """
+    Строки таблицы device из порции сканера, без ORM-объектов.
+    """
+    return [
+        (True, ip, mac, vendor, hostname, scan_id, scan_start)
+        for ip, mac, vendor, hostname in devices.rows()
+    ]
+
+
+class DeviceCopier:
+    """
+    Запись устройств в таблицу device через COPY (asyncpg).
+        Порция сканера передается в copy_records_to_table напрямую, минуя
+        unit of work SQLAlchemy.
+    Пример
+        copier = await DeviceCopier.connect()
+        await copier.copy(devices, scan_id, scan_start)
+        await copier.close()
+    """
+
+    def __init__(self, connection: asyncpg.Connection):
+        self.connection = connection
+
+    @classmethod
+    async def connect(cls, dsn: str = ASYNCPG_DSN) -> "DeviceCopier":
+        return cls(await asyncpg.connect(dsn))
+
+    async def copy(
+        self, devices: "DeviceChunk", scan_id: int, scan_start: datetime
+    ) -> int:
+        records = device_records(devices, scan_id, scan_start)
+        if records:
+            await self.connection.copy_records_to_table(
+                "device", records=records, columns=DEVICE_COLUMNS
+            )
+        return len(records)
+
+    async def close(self):
+        await self.connection.close()
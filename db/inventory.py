@@ -0,0 +1,267 @@
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterable, Set, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from scanner.ranges import HostRange, RangeSet, parse_address
+
+from .models import DeviceEvent, DevicePresence, DeviceState
+from .settings import INVENTORY_TOUCH_INTERVAL
+
+if TYPE_CHECKING:
+    from scanner.chunk import DeviceChunk
+
+ATTRIBUTES = ("hostname", "vendor")
+
+
+class Inventory:
+    """
+    Инкрементальный учет устройств.
+        Состояние устройств (device_state) загружается один раз и хранится в
+        памяти, порции сканирования сравниваются с ним. В БД пишутся только
+        новые устройства, изменения атрибутов и исчезновения (device_event);
+        для сканирований с точкой продолжения (presence=True) - еще одна
+        строка device_presence на порцию с id найденных устройств, она
+        нужна только для продолжения и удаляется при его завершении
+        (checkpoints.drop_presence).
+        last_seen неизменившихся устройств обновляется не чаще раза в
+        touch_interval секунд. Ключ устройства - пара (ip, mac).
+        apply и finish только готовят изменения состояния в памяти, они
+        применяются вызовом commit после успешной фиксации транзакции.
+    Пример
+        inventory = Inventory()
+        inventory.load(session)
+        inventory.apply(session, devices, scan_id, datetime.now())
+        session.commit()
+        inventory.commit()
+        inventory.finish(session, scan_id, datetime.now(), networks)
+        session.commit()
+        inventory.commit()
+    """
+
+    def __init__(self, touch_interval: float = INVENTORY_TOUCH_INTERVAL):
+        self.touch_interval = touch_interval
+        # (ip, mac) -> [id, атрибуты, present, last_seen]
+        self._states: Dict[Tuple[str, str], list] = {}
+        self._seen = set()
+        self._pending = None
+
+    def load(self, session: Session, resume_scan_id: int = None):
+        """
+        Загрузка состояния устройств.
+            При продолжении сканирования resume_scan_id устройства, уже
+            учтенные в нем (device_presence), считаются найденными за
+            проход.
+        """
+        rows = session.query(
+            DeviceState.id,
+            DeviceState.ip,
+            DeviceState.mac,
+            DeviceState.present,
+            DeviceState.last_seen,
+            *(getattr(DeviceState, name) for name in ATTRIBUTES),
+        ).all()
+        self._states = {
+            (str(row.ip), row.mac): [
+                row.id,
+                {name: getattr(row, name) for name in ATTRIBUTES},
+                row.present,
+                row.last_seen,
+            ]
+            for row in rows
+        }
+        self._seen = set()
+        self._pending = None
+        if resume_scan_id is not None:
+            found = set(
+                session.scalars(
+                    sa.select(sa.func.unnest(DevicePresence.state_ids)).where(
+                        DevicePresence.scan_id == resume_scan_id
+                    )
+                )
+            )
+            self._seen = {
+                key for key, state in self._states.items() if state[0] in found
+            }
+
+    def _event(
+        self,
+        event: str,
+        key: Tuple[str, str],
+        state_id,
+        scan_id,
+        now,
+        changes=None,
+    ) -> dict:
+        return dict(
+            event=event,
+            time=now,
+            ip=key[0],
+            mac=key[1],
+            changes=changes,
+            state_id=state_id,
+            scan_id=scan_id,
+        )
+
+    def _stale(self, last_seen: datetime, now: datetime) -> bool:
+        return (
+            last_seen is None
+            or (now - last_seen).total_seconds() >= self.touch_interval
+        )
+
+    def apply(
+        self,
+        session: Session,
+        devices: "DeviceChunk",
+        scan_id: int,
+        now: datetime,
+        presence: bool = False,
+    ) -> int:
+        """
+        Сравнение порции с состоянием и запись изменений.
+            presence - записать найденные устройства в device_presence.
+            Возвращает число записанных событий.
+        """
+        seen: Set[Tuple[str, str]] = set()
+        states: Dict[Tuple[str, str], list] = {}
+        new_rows = []
+        events = []
+        found = []
+        touched = []
+        for ip, mac, vendor, hostname in devices.rows():
+            key = (ip, mac)
+            if key in self._seen or key in seen:
+                continue
+            seen.add(key)
+            attrs = {"hostname": hostname, "vendor": vendor}
+            state = self._states.get(key)
+            if state is None:
+                new_rows.append(
+                    dict(
+                        ip=key[0],
+                        mac=key[1],
+                        present=True,
+                        first_seen=now,
+                        last_seen=now,
+                        scan_id=scan_id,
+                        **attrs,
+                    )
+                )
+                continue
+            state_id, old_attrs, present, last_seen = state
+            found.append(state_id)
+            changes = {
+                name: [old_attrs[name], attrs[name]]
+                for name in ATTRIBUTES
+                if old_attrs[name] != attrs[name]
+            }
+            if not present:
+                events.append(
+                    self._event("appeared", key, state_id, scan_id, now)
+                )
+            if changes:
+                events.append(
+                    self._event(
+                        "changed", key, state_id, scan_id, now, changes
+                    )
+                )
+            if changes or not present:
+                session.execute(
+                    sa.update(DeviceState)
+                    .where(DeviceState.id == state_id)
+                    .values(
+                        present=True, last_seen=now, scan_id=scan_id, **attrs
+                    )
+                )
+                states[key] = [state_id, attrs, True, now]
+            elif self._stale(last_seen, now):
+                touched.append(state_id)
+                states[key] = [state_id, old_attrs, True, now]
+        if new_rows:
+            session.bulk_insert_mappings(
+                DeviceState, new_rows, return_defaults=True
+            )
+            for row in new_rows:
+                key = (row["ip"], row["mac"])
+                attrs = {name: row[name] for name in ATTRIBUTES}
+                states[key] = [row["id"], attrs, True, now]
+                found.append(row["id"])
+                events.append(
+                    self._event("appeared", key, row["id"], scan_id, now)
+                )
+        if touched:
+            session.execute(
+                sa.update(DeviceState)
+                .where(DeviceState.id.in_(touched))
+                .values(last_seen=now, scan_id=scan_id)
+            )
+        if presence and found:
+            session.execute(
+                sa.insert(DevicePresence).values(
+                    scan_id=scan_id, state_ids=found
+                )
+            )
+        if events:
+            session.bulk_insert_mappings(DeviceEvent, events)
+        self._pending = (seen, states, False)
+        return len(events)
+
+    def finish(
+        self,
+        session: Session,
+        scan_id: int,
+        now: datetime,
+        networks: Iterable[HostRange] = None,
+    ) -> int:
+        """
+        Отметка устройств, не найденных за проход, как исчезнувших.
+            networks - диапазоны прохода: устройства вне их не
+            сканировались и исчезнувшими не считаются. Возвращает число
+            исчезнувших устройств.
+        """
+        scanned = RangeSet(networks) if networks is not None else None
+        gone = [
+            key
+            for key, (_, _, present, _) in self._states.items()
+            if present
+            and key not in self._seen
+            and (scanned is None or parse_address(key[0]) in scanned)
+        ]
+        states = {}
+        if gone:
+            ids = [self._states[key][0] for key in gone]
+            session.execute(
+                sa.update(DeviceState)
+                .where(DeviceState.id.in_(ids))
+                .values(present=False)
+            )
+            session.bulk_insert_mappings(
+                DeviceEvent,
+                [
+                    self._event(
+                        "disappeared", key, self._states[key][0], scan_id, now
+                    )
+                    for key in gone
+                ],
+            )
+            for key in gone:
+                state_id, attrs, _, last_seen = self._states[key]
+                states[key] = [state_id, attrs, False, last_seen]
+        self._pending = (set(), states, True)
+        return len(gone)
+
+    def commit(self):
+        """
+        Применение изменений последнего apply или finish к состоянию в
+        памяти, вызывается после успешной фиксации их транзакции.
+        """
+        if self._pending is None:
+            return
+        seen, states, finished = self._pending
+        self._pending = None
+        self._states.update(states)
+        if finished:
+            self._seen = set()
+        else:
+            self._seen |= seen
@@ -0,0 +1,10 @@
+"""
+Метрики записи результатов сканирования в формате Prometheus.
+    Записей в секунду - скорость netscan_db_rows_total.
+"""
+from prometheus_client import Counter, Histogram
+
+DB_WRITE_SECONDS = Histogram(
+    "netscan_db_write_seconds", "Database write time per chunk"
+)
+DB_ROWS = Counter("netscan_db_rows_total", "Device rows written")
@@ -3,21 +3,47 @@ import datetime
 import sqlalchemy as sa
 import sqlalchemy.orm as orm
 import sqlalchemy_utils as su
+from sqlalchemy.dialects import postgresql
 
 metadata = sa.MetaData()
 Base = orm.declarative_base()
 
 
 class Device(Base):
+    """
+    Устройство из снимка сканирования.
+        Таблица секционирована по времени начала сканирования (scan_start),
+        по одной секции на сутки (см. db.partitions). Поиск по подсети
+        (ip::inet <<= сеть) и подстроке имени хоста (ILIKE) идет по
+        индексам GiST и GIN (pg_trgm), по вендору - по индексу (vendor, id)
+        в порядке постраничного вывода, см. api.crud.filter_devices.
+    """
+
     __tablename__ = "device"
+    __table_args__ = (
+        sa.Index(
+            "ix_device_ip_inet",
+            sa.text("(ip::inet) inet_ops"),
+            postgresql_using="gist",
+        ),
+        sa.Index(
+            "ix_device_hostname_trgm",
+            "hostname",
+            postgresql_using="gin",
+            postgresql_ops={"hostname": "gin_trgm_ops"},
+        ),
+        sa.Index("ix_device_vendor_id", "vendor", "id"),
+        {"postgresql_partition_by": "RANGE (scan_start)"},
+    )
 
-    id = sa.Column(sa.Integer, primary_key=True)
+    id = sa.Column(sa.BigInteger, primary_key=True)
     ipv4 = sa.Column(sa.Boolean, default=True)
-    ip = sa.Column(su.IPAddressType)
-    mac = sa.Column(sa.String)
+    ip = sa.Column(su.IPAddressType, index=True)
+    mac = sa.Column(sa.String, index=True)
     vendor = sa.Column(sa.String)
     hostname = sa.Column(sa.String)
-    scan_id = sa.Column("Scan", sa.ForeignKey("scan.id"))
+    scan_id = sa.Column(sa.ForeignKey("scan.id"), index=True)
+    scan_start = sa.Column(sa.DateTime, primary_key=True)
 
 
 class Scan(Base):
@@ -33,3 +59,79 @@ class Scan(Base):
     start = sa.Column(sa.DateTime)
     finish = sa.Column(sa.DateTime)
     starter = sa.Column(su.ChoiceType(STARTER))
+
+
+class ScanCheckpoint(Base):
+    """
+    Точка продолжения сканирования.
+        networks - нормализованные диапазоны прохода [[first, last], ...],
+        chunk_size и seed - параметры scanner.ranges.AddressStream,
+        position - курсор AddressStream: устройства всех адресов до него
+        записаны. position обновляется в одной транзакции с устройствами
+        порции, done - сканирование завершено.
+    """
+
+    __tablename__ = "scan_checkpoint"
+
+    scan_id = sa.Column(sa.ForeignKey("scan.id"), primary_key=True)
+    networks = sa.Column(sa.JSON)
+    chunk_size = sa.Column(sa.Integer)
+    seed = sa.Column(sa.BigInteger)
+    position = sa.Column(sa.BigInteger, default=0)
+    done = sa.Column(sa.Boolean, default=False, index=True)
+
+
+class DeviceState(Base):
+    """
+    Текущее состояние устройства (инкрементальный режим).
+    """
+
+    __tablename__ = "device_state"
+    __table_args__ = (sa.UniqueConstraint("ip", "mac"),)
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    ip = sa.Column(su.IPAddressType)
+    mac = sa.Column(sa.String)
+    vendor = sa.Column(sa.String)
+    hostname = sa.Column(sa.String)
+    present = sa.Column(sa.Boolean, default=True)
+    first_seen = sa.Column(sa.DateTime)
+    last_seen = sa.Column(sa.DateTime)
+    scan_id = sa.Column(sa.ForeignKey("scan.id"))
+
+
+class DevicePresence(Base):
+    """
+    Устройства, найденные сканированием (инкрементальный режим).
+        Одна строка на порцию: id состояний (device_state) найденных
+        устройств, вместо обновления каждой строки device_state.
+    """
+
+    __tablename__ = "device_presence"
+
+    id = sa.Column(sa.BigInteger, primary_key=True)
+    scan_id = sa.Column(sa.ForeignKey("scan.id"), index=True)
+    state_ids = sa.Column(postgresql.ARRAY(sa.Integer))
+
+
+class DeviceEvent(Base):
+    """
+    Журнал изменений устройств (инкрементальный режим).
+    """
+
+    EVENT = [
+        ('appeared', 'Appeared'),
+        ('disappeared', 'Disappeared'),
+        ('changed', 'Changed'),
+    ]
+
+    __tablename__ = "device_event"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    event = sa.Column(su.ChoiceType(EVENT))
+    time = sa.Column(sa.DateTime)
+    ip = sa.Column(su.IPAddressType)
+    mac = sa.Column(sa.String)
+    changes = sa.Column(sa.JSON)
+    state_id = sa.Column(sa.ForeignKey("device_state.id"))
+    scan_id = sa.Column(sa.ForeignKey("scan.id"))
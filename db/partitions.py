@@ -0,0 +1,80 @@
+import logging
+import re
+from datetime import date, datetime, timedelta
+from typing import List
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger("runner")
+
+PARENT = "device"
+PREFIX = "device_p"
+# Секция для строк без суточной секции (старые строки, продолженные
+# сканирования, суточная секция которых уже удалена).
+DEFAULT = "device_default"
+_NAME = re.compile(rf"^{PREFIX}(\d{{8}})$")
+
+
+def partition_name(day: date) -> str:
+    return f"{PREFIX}{day:%Y%m%d}"
+
+
+def ensure_partitions(conn: Connection, start: date, days: int = 2):
+    """
+    Создание суточных секций device с start на days дней вперед.
+    """
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        conn.execute(
+            sa.text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(day)} "
+                f"PARTITION OF {PARENT} "
+                f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+            )
+        )
+
+
+def get_partitions(conn: Connection) -> List[date]:
+    rows = conn.execute(
+        sa.text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = :parent"
+        ),
+        {"parent": PARENT},
+    )
+    days = []
+    for (name,) in rows:
+        match = _NAME.match(name)
+        if match:
+            days.append(datetime.strptime(match[1], "%Y%m%d").date())
+    return sorted(days)
+
+
+def drop_partitions(
+    conn: Connection, keep_days: int, today: date = None
+) -> List[str]:
+    """
+    Удаление суточных секций старше keep_days дней.
+        Секция отсоединяется и удаляется целиком, без DELETE по строкам.
+        Из секции по умолчанию строки старше keep_days дней удаляются
+        DELETE по scan_start. Возвращает имена удаленных секций.
+    """
+    border = (today or date.today()) - timedelta(days=keep_days)
+    dropped = []
+    for day in get_partitions(conn):
+        if day >= border:
+            break
+        name = partition_name(day)
+        conn.execute(sa.text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        conn.execute(sa.text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    logger.info("Dropped device partitions: %s", dropped)
+    result = conn.execute(
+        sa.text(f"DELETE FROM {DEFAULT} WHERE scan_start < :border"),
+        {"border": border},
+    )
+    logger.info("Deleted %s old rows from %s", result.rowcount, DEFAULT)
+    return dropped
@@ -3,7 +3,7 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
-from .database import Database
+from .database import AsyncDatabase, Database
 
 load_dotenv()
 
@@ -14,5 +14,17 @@ DB_HOST = environ.get("DB_HOST")
 DATABASE_URL = (
     f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:5432/{DB_NAME}"
 )
+ASYNCPG_DSN = DATABASE_URL
+ASYNC_DATABASE_URL = (
+    f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:5432/{DB_NAME}"
+)
+DB_POOL_SIZE = int(environ.get("DB_POOL_SIZE", 5))
+DEVICE_RETENTION_DAYS = int(environ.get("DEVICE_RETENTION_DAYS", 30))
+# Как часто обновлять last_seen неизменившихся устройств (инкрементальный
+# режим), секунды.
+INVENTORY_TOUCH_INTERVAL = float(environ.get("INVENTORY_TOUCH_INTERVAL", 3600))
 
 database = Database(db_url=DATABASE_URL)
+async_database = AsyncDatabase(
+    db_url=ASYNC_DATABASE_URL, pool_size=DB_POOL_SIZE
+)
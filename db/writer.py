@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, List
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Row
+from log_settings import context
+
+from . import checkpoints, metrics, models, partitions
+from .database import AsyncDatabase
+from .ingest import DEVICE_COLUMNS, device_records
+from .inventory import Inventory
+from .settings import async_database
+
+if TYPE_CHECKING:
+    from scanner.budget import MemoryBudget
+    from scanner.chunk import DeviceChunk
+    from scanner.ranges import AddressStream, HostRange
+
+logger = logging.getLogger("runner")
+
+_DONE = object()
+
+
+class ScanWriter:
+    """
+    Асинхронная запись результатов одного сканирования.
+        Создает запись Scan и хранит ее id (он же попадает в
+        log_settings.context.scan_id вызывающего кода). Порции передаются в write и
+        пишутся отдельной задачей, поэтому запись идет одновременно с
+        опросом следующих порций; очередь размера queue_size ограничивает
+        число незаписанных порций. Устройства порции и обновление finish
+        выполняются в одной транзакции. При copy=True устройства пишутся
+        через COPY, при ошибке - через ORM. При заданном inventory
+        пишутся только изменения (см. inventory.Inventory), исчезнувшими
+        считаются только устройства из диапазонов прохода networks. При заданном
+        budget после записи порции освобождается занятый ею бюджет памяти
+        (см. scanner.budget.MemoryBudget).
+        При заданном checkpoint (scanner.ranges.AddressStream источника
+        порций) создается точка продолжения (models.ScanCheckpoint), курсор
+        потока записывается в одной транзакции с устройствами порции.
+        resume - точка продолжения незавершенного сканирования
+        (checkpoints.unfinished): новое сканирование не создается, порции
+        дописываются в него.
+    Пример
+        writer = ScanWriter(starter="manual")
+        await writer.start()
+        await writer.write(devices)
+        await writer.close()
+    """
+
+    def __init__(
+        self,
+        starter: str = "manual",
+        copy: bool = True,
+        queue_size: int = 2,
+        inventory: Inventory = None,
+        database: AsyncDatabase = async_database,
+        budget: "MemoryBudget" = None,
+        checkpoint: "AddressStream" = None,
+        resume: Row = None,
+        networks: List["HostRange"] = None,
+    ):
+        self.starter = starter
+        self.copy = copy
+        self.inventory = inventory
+        self.database = database
+        self.budget = budget
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.networks = networks
+        self.scan_id = None
+        self.start_time = None
+        self.rows = 0
+        self._queue = asyncio.Queue(queue_size)
+        self._task = None
+
+    async def start(self) -> int:
+        if self.resume is not None:
+            self.scan_id = self.resume.scan_id
+            self.start_time = self.resume.start
+            logger.info(
+                "Scan %s resumed at position %s",
+                self.scan_id,
+                self.resume.position,
+            )
+        else:
+            await self._create()
+        if self.inventory is not None:
+            async with self.database.session() as session:
+                await session.run_sync(
+                    self.inventory.load,
+                    self.scan_id if self.resume is not None else None,
+                )
+        context.scan_id.set(self.scan_id)
+        logger.debug("Scan id = %s", self.scan_id)
+        self._task = asyncio.ensure_future(self._run())
+        return self.scan_id
+
+    async def _create(self):
+        self.start_time = datetime.now()
+        async with self.database.engine.begin() as conn:
+            await conn.run_sync(
+                partitions.ensure_partitions, self.start_time.date()
+            )
+            result = await conn.execute(
+                sa.insert(models.Scan)
+                .values(start=self.start_time, starter=self.starter)
+                .returning(models.Scan.id)
+            )
+            self.scan_id = result.scalar_one()
+            if self.checkpoint is not None:
+                await conn.execute(
+                    sa.insert(models.ScanCheckpoint).values(
+                        scan_id=self.scan_id,
+                        networks=[
+                            [item.first, item.last]
+                            for item in self.checkpoint.ranges
+                        ],
+                        chunk_size=self.checkpoint.chunk_size,
+                        seed=self.checkpoint.seed,
+                        position=self.checkpoint.position,
+                        done=False,
+                    )
+                )
+
+    async def _put(self, item):
+        """
+        Постановка в очередь записи с ожиданием места. Если задача записи
+        завершилась ошибкой, ошибка поднимается здесь, а не блокирует
+        ожидание места в очереди.
+        """
+        put = asyncio.ensure_future(self._queue.put(item))
+        await asyncio.wait(
+            {put, self._task}, return_when=asyncio.FIRST_COMPLETED
+        )
+        if self._task.done():
+            if not put.cancel():
+                item = _DONE
+            await self._release_pending(item)
+            self._task.result()
+        await put
+
+    async def write(self, devices: "DeviceChunk"):
+        """
+        Постановка порции в очередь записи.
+            Ждет, если очередь заполнена.
+        """
+        await self._put(devices)
+
+    async def close(self):
+        """
+        Дожидается записи всех порций.
+        """
+        await self._put(_DONE)
+        await self._task
+        if self.inventory is not None:
+            async with self.database.session() as session:
+                gone = await session.run_sync(
+                    self.inventory.finish,
+                    self.scan_id,
+                    datetime.now(),
+                    self.networks,
+                )
+                await session.commit()
+            self.inventory.commit()
+            logger.debug("Devices disappeared: %s", gone)
+        if self._checkpointed:
+            async with self.database.engine.begin() as conn:
+                await conn.execute(
+                    sa.update(models.ScanCheckpoint)
+                    .where(models.ScanCheckpoint.scan_id == self.scan_id)
+                    .values(done=True)
+                )
+                await conn.run_sync(checkpoints.drop_presence, self.scan_id)
+
+    async def _run(self):
+        while True:
+            devices = await self._queue.get()
+            if devices is _DONE:
+                break
+            started = time.perf_counter()
+            try:
+                await self._write_chunk(devices)
+            except BaseException:
+                await self._release_pending(devices)
+                raise
+            metrics.DB_WRITE_SECONDS.observe(time.perf_counter() - started)
+            metrics.DB_ROWS.inc(len(devices))
+            self.rows += len(devices)
+            if self.budget is not None:
+                await self.budget.release(len(devices))
+
+    async def _release_pending(self, devices: "DeviceChunk"):
+        """
+        Освобождение бюджета порции devices, не записанной из-за ошибки, и
+        порций в очереди, чтобы этап пинга не ждал его бесконечно.
+        """
+        count = 0 if devices is _DONE else len(devices)
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _DONE:
+                count += len(item)
+        if self.budget is not None:
+            await self.budget.release(count)
+
+    @property
+    def _checkpointed(self) -> bool:
+        return self.checkpoint is not None or self.resume is not None
+
+    def _progress_statements(self, devices: "DeviceChunk") -> list:
+        """
+        Обновление finish сканирования и курсора точки продолжения,
+        выполняемые в транзакции записи порции.
+        """
+        statements = [
+            sa.update(models.Scan)
+            .where(models.Scan.id == self.scan_id)
+            .values(finish=datetime.now())
+        ]
+        if self._checkpointed and devices.position is not None:
+            statements.append(
+                sa.update(models.ScanCheckpoint)
+                .where(models.ScanCheckpoint.scan_id == self.scan_id)
+                .values(position=devices.position)
+            )
+        return statements
+
+    async def _write_chunk(self, devices: "DeviceChunk"):
+        if self.inventory is not None:
+            async with self.database.session() as session:
+                await session.run_sync(
+                    self.inventory.apply,
+                    devices,
+                    self.scan_id,
+                    datetime.now(),
+                    self._checkpointed,
+                )
+                for statement in self._progress_statements(devices):
+                    await session.execute(statement)
+                await session.commit()
+            self.inventory.commit()
+            return
+        if self.copy:
+            try:
+                await self._copy_chunk(devices)
+                return
+            except Exception:
+                logger.exception("COPY failed, using ORM for the chunk.")
+        await self._orm_chunk(devices)
+
+    async def _copy_chunk(self, devices: "DeviceChunk"):
+        async with self.database.engine.begin() as conn:
+            for statement in self._progress_statements(devices):
+                await conn.execute(statement)
+            if devices:
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_records_to_table(
+                    "device",
+                    records=device_records(
+                        devices, self.scan_id, self.start_time
+                    ),
+                    columns=DEVICE_COLUMNS,
+                )
+
+    async def _orm_chunk(self, devices: "DeviceChunk"):
+        async with self.database.session() as session:
+            for statement in self._progress_statements(devices):
+                await session.execute(statement)
+            session.add_all(
+                [
+                    models.Device(
+                        ip=ip,
+                        mac=mac,
+                        hostname=hostname,
+                        vendor=vendor,
+                        scan_id=self.scan_id,
+                        scan_start=self.start_time,
+                    )
+                    for ip, mac, vendor, hostname in devices.rows()
+                ]
+            )
+            await session.commit()
@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+import logging
+import logging.config
+import sys
+
+from db import export
+from log_settings.settings import logger_config
+
+logging.config.dictConfig(logger_config)
+logger = logging.getLogger("runner")
+
+
+async def export_scan(scan_id: int, output, fmt: str = "ndjson", gzip=False):
+    """
+    Скрипт выгрузки устройств сканирования в файл или stdout.
+    Данные пишутся по мере чтения из БД, без загрузки всей выборки в память.
+    """
+    size = 0
+    async for data in export.stream_scan(scan_id, fmt, gzip):
+        output.write(data)
+        size += len(data)
+    logger.info("Scan %s exported, %s bytes", scan_id, size)
+    return size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("scan_id", type=int)
+    parser.add_argument("--format", choices=export.FORMATS, default="ndjson")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("-o", "--output", help="File path, stdout if omitted")
+    args = parser.parse_args()
+    if args.output:
+        with open(args.output, "wb") as output:
+            asyncio.run(
+                export_scan(args.scan_id, output, args.format, args.gzip)
+            )
+    else:
+        asyncio.run(
+            export_scan(
+                args.scan_id, sys.stdout.buffer, args.format, args.gzip
+            )
+        )
@@ -0,0 +1,21 @@
+import logging
+from contextvars import ContextVar
+
+# Идентификаторы сканирования и порции для связи записей журнала.
+# Задачи asyncio копируют контекст при создании, поэтому значения,
+# установленные до запуска конвейера, видны во всех его этапах.
+scan_id: ContextVar = ContextVar("scan_id", default=None)
+chunk_id: ContextVar = ContextVar("chunk_id", default=None)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Добавляет к записи журнала scan_id и chunk_id текущего контекста.
+        Должен стоять на обработчике, вызываемом в потоке сканирования
+        (до очереди), иначе контекст будет потерян.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.scan_id = scan_id.get()
+        record.chunk_id = chunk_id.get()
+        return True
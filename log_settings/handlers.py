@@ -0,0 +1,140 @@
+import atexit
+import json
+import logging
+import multiprocessing.util
+import os
+import queue
+import weakref
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+
+# Передается в extra записей, которые пишутся для каждого адреса:
+# logger.debug("...", ip, extra=SAMPLED)
+SAMPLED = {"sampled": True}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Запись журнала одной строкой json с идентификаторами сканирования и
+    порции (см. context.ContextFilter).
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "scan_id": getattr(record, "scan_id", None),
+            "chunk_id": getattr(record, "chunk_id", None),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает одну из каждых round(1 / rate) записей, отмеченных SAMPLED,
+    отдельно для каждого шаблона сообщения. Остальные записи не трогает.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counts = Counter()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False):
+            return True
+        if not self.every:
+            return False
+        count = self._counts[record.msg]
+        self._counts[record.msg] = count + 1
+        return count % self.every == 0
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Неблокирующая запись журнала в файл.
+        Вызывающий поток только кладет запись в очередь, форматирование и
+        запись в файл выполняет поток QueueListener. Используется из
+        dictConfig вместо logging.FileHandler (см. settings.LOG_MODE).
+        Дочерний процесс после fork (пул sharding.ShardedDevices) не
+        наследует поток, поэтому в нем запускаются своя очередь и свой
+        QueueListener.
+    Параметры
+        filename - файл журнала.
+        as_json - писать записи в формате json (JsonFormatter).
+        fmt, style - формат текстовых записей, как у logging.Formatter.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        as_json: bool = False,
+        fmt: str = None,
+        style: str = "%",
+    ):
+        super().__init__(queue.SimpleQueue())
+        self.filename = filename
+        if as_json:
+            self.target_formatter = JsonFormatter()
+        else:
+            self.target_formatter = logging.Formatter(fmt, style=style)
+        self._start()
+        atexit.register(self.close)
+        handler = weakref.ref(self)
+        os.register_at_fork(
+            after_in_child=lambda: handler() and handler()._restart()
+        )
+        # Процессы multiprocessing завершаются без atexit, очередь
+        # дописывается финализатором процесса.
+        multiprocessing.util.register_after_fork(
+            self, QueueListenerHandler._finalize_in_child
+        )
+
+    def _start(self):
+        self.target = logging.FileHandler(self.filename)
+        self.target.setFormatter(self.target_formatter)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def _finalize_in_child(self):
+        multiprocessing.util.Finalize(self, self.close, exitpriority=0)
+
+    def _restart(self):
+        """
+        Новые очередь и поток после fork: поток родителя в дочернем
+        процессе не работает, а записи в унаследованной очереди уже
+        записывает родитель.
+        """
+        if self.listener is None:
+            return
+        self.queue = queue.SimpleQueue()
+        self._start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        В вызывающем потоке в сообщение только подставляются аргументы
+        (они могут измениться позже), форматирование записи и запись в
+        файл выполняются в потоке QueueListener.
+        """
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            self.target.close()
+        super().close()
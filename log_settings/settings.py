@@ -6,24 +6,66 @@ from dotenv import dotenv_values, find_dotenv, load_dotenv
 
 load_dotenv(find_dotenv())
 LEVEL = os.environ.get("SCAN_LOGLEVEL", "WARNING")
+# sync - запись в файл в потоке сканирования, queue - через очередь в
+# отдельном потоке (log_settings.handlers.QueueListenerHandler).
+LOG_MODE = os.environ.get("SCAN_LOG_MODE", "sync")
+# text или json (с идентификаторами сканирования и порции).
+LOG_FORMAT = os.environ.get("SCAN_LOG_FORMAT", "text")
+# Доля записей, которые пишутся для каждого адреса (handlers.SAMPLED).
+LOG_SAMPLE = float(os.environ.get("SCAN_LOG_SAMPLE", 1))
+LOG_FILE = os.environ.get("SCAN_LOG_FILE", "log.log")
+
+STD_FORMAT = "{asctime} - {levelname} - {name} - {message}"
+
+
+def _file_handler() -> dict:
+    handler = {
+        "level": LEVEL,
+        "filters": ["context", "sampling"],
+    }
+    if LOG_MODE == "queue":
+        handler.update(
+            {
+                "()": "log_settings.handlers.QueueListenerHandler",
+                "filename": LOG_FILE,
+                "as_json": LOG_FORMAT == "json",
+                "fmt": STD_FORMAT,
+                "style": "{",
+            }
+        )
+    else:
+        handler.update(
+            {
+                "class": "logging.FileHandler",
+                "formatter": (
+                    "json_format" if LOG_FORMAT == "json" else "std_format"
+                ),
+                "filename": LOG_FILE,
+            }
+        )
+    return handler
+
 
 logger_config = {
     "version": 1,
     "disable_existing_loggers": False,
     "formatters": {
         "std_format": {
-            "format": "{asctime} - {levelname} - {name} - {message}",
+            "format": STD_FORMAT,
             "style": "{",
-        }
+        },
+        "json_format": {"()": "log_settings.handlers.JsonFormatter"},
     },
-    "handlers": {
-        "file_handler": {
-            "class": "logging.FileHandler",
-            "level": LEVEL,
-            "formatter": "std_format",
-            "filename": "log.log",
+    "filters": {
+        "context": {"()": "log_settings.context.ContextFilter"},
+        "sampling": {
+            "()": "log_settings.handlers.SamplingFilter",
+            "rate": LOG_SAMPLE,
         },
     },
+    "handlers": {
+        "file_handler": _file_handler(),
+    },
     "loggers": {
         "scanner": {
             "level": LEVEL,
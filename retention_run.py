@@ -0,0 +1,33 @@
+import logging
+import logging.config
+from datetime import date, datetime, timedelta
+
+from db import checkpoints, partitions
+from db.settings import DEVICE_RETENTION_DAYS
+from db.settings import database as db
+from log_settings.settings import logger_config
+
+logging.config.dictConfig(logger_config)
+logger = logging.getLogger("runner")
+
+
+def drop_old_partitions(keep_days: int = DEVICE_RETENTION_DAYS):
+    """
+    Скрипт очистки таблицы device.
+    Создает секции на ближайшие дни и удаляет секции старше keep_days дней
+    и такие же старые строки секции по умолчанию, а также строки
+    device_presence незавершенных сканирований старше keep_days дней.
+    """
+    with db.engine.begin() as conn:
+        partitions.ensure_partitions(conn, date.today())
+        dropped = partitions.drop_partitions(conn, keep_days)
+        pruned = checkpoints.drop_presence(
+            conn, before=datetime.now() - timedelta(days=keep_days)
+        )
+    logger.info("Retention pruned %s device_presence rows", pruned)
+    logger.info("Retention finished, dropped %s partitions", len(dropped))
+    return dropped
+
+
+if __name__ == "__main__":
+    drop_old_partitions()
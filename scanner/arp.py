@@ -0,0 +1,313 @@
+import asyncio
+import logging
+import socket
+import struct
+import time
+from ipaddress import IPv4Interface
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import netifaces
+
+from . import metrics
+from .chunk import format_mac
+from .neighbors import NeighborTable
+from .ping import PingEngine
+from .ranges import HostRange, format_address
+
+logger = logging.getLogger("scanner")
+
+ETH_P_ARP = 0x0806
+ETH_P_IP = 0x0800
+ARP_REQUEST = 1
+ARP_REPLY = 2
+BROADCAST = b"\xff" * 6
+# Заголовок Ethernet и пакет ARP для IPv4 поверх Ethernet.
+_FRAME = struct.Struct("!6s6sHHHBBH6sI6sI")
+
+
+class ArpPacket(NamedTuple):
+    operation: int
+    sender_mac: bytes
+    sender_ip: int
+    target_mac: bytes
+    target_ip: int
+
+
+def build_frame(
+    operation: int,
+    sender_mac: bytes,
+    sender_ip: int,
+    target_ip: int,
+    target_mac: bytes = b"\x00" * 6,
+    destination: bytes = BROADCAST,
+) -> bytes:
+    """
+    Кадр Ethernet с пакетом ARP (по умолчанию широковещательный).
+    """
+    return _FRAME.pack(
+        destination,
+        sender_mac,
+        ETH_P_ARP,
+        1,
+        ETH_P_IP,
+        6,
+        4,
+        operation,
+        sender_mac,
+        sender_ip,
+        target_mac,
+        target_ip,
+    )
+
+
+def parse_frame(frame: bytes) -> Optional[ArpPacket]:
+    """
+    Пакет ARP из кадра Ethernet, None - кадр не ARP для IPv4.
+    """
+    if len(frame) < _FRAME.size:
+        return None
+    fields = _FRAME.unpack_from(frame)
+    if fields[2] != ETH_P_ARP or fields[3:7] != (1, ETH_P_IP, 6, 4):
+        return None
+    return ArpPacket(*fields[7:])
+
+
+class Link(NamedTuple):
+    """
+    Сеть, подключенная к интерфейсу напрямую (on-link).
+    """
+
+    name: str
+    interface: IPv4Interface
+
+    @property
+    def hosts(self) -> HostRange:
+        return HostRange.from_network(self.interface.network)
+
+
+def local_links(exclude: List[str] = None) -> List[Link]:
+    """
+    On-link сети системных интерфейсов, кроме loopback и /31, /32.
+    """
+    links = []
+    for name in netifaces.interfaces():
+        if exclude and name in exclude:
+            continue
+        for item in netifaces.ifaddresses(name).get(netifaces.AF_INET, []):
+            interface = IPv4Interface(f"{item['addr']}/{item['netmask']}")
+            if interface.ip.is_loopback or interface.network.prefixlen > 30:
+                continue
+            links.append(Link(name, interface))
+    return links
+
+
+class LinkSocket:
+    """
+    Сокет AF_PACKET для кадров ARP на интерфейсе (нужен CAP_NET_RAW).
+    """
+
+    def __init__(self, name: str):
+        self._socket = socket.socket(
+            socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP)
+        )
+        self._socket.bind((name, ETH_P_ARP))
+        self._socket.setblocking(False)
+        self.mac = self._socket.getsockname()[4]
+
+    def fileno(self) -> int:
+        return self._socket.fileno()
+
+    def send(self, frame: bytes) -> int:
+        return self._socket.send(frame)
+
+    def recv(self, size: int) -> bytes:
+        return self._socket.recv(size)
+
+    def close(self):
+        self._socket.close()
+
+
+class ArpEngine:
+    """
+    Опрос адресов on-link сетей запросами ARP.
+        Для адресов из сетей links запросы ARP отправляются через сокет
+        AF_PACKET со скоростью rate запросов в секунду, ответы собираются
+        за один проход: ответивший адрес активен, его mac берется из
+        ответа и добавляется в neighbors (NeighborTable.learn), поэтому
+        этап arp не читает arp-кэш. Хосты, не отвечающие на icmp, тоже
+        находятся. Не ответившие адреса опрашиваются повторно retries раз.
+        Остальные (маршрутизируемые) адреса опрашиваются fallback
+        (ping.PingEngine). Интерфейс опроса как у PingEngine.
+    Параметры
+        links - on-link сети (local_links()).
+        fallback - движок icmp-опроса для остальных адресов.
+        neighbors - снимок arp-кэша, в который записываются ответы.
+        rate - запросов в секунду на интерфейс.
+        timeout - ожидание ответов после последнего запроса, секунды.
+        retries - число повторных запросов не ответившим адресам.
+        socket_factory - функция (имя интерфейса) -> сокет с методами
+            fileno, send, recv и атрибутом mac (например, воспроизведение
+            записанных пакетов в benchmarks.simulation).
+    Пример
+        engine = ArpEngine(local_links(), fallback=PingEngine())
+        alives = await engine.sweep([3232235777, 3232235778])
+    """
+
+    def __init__(
+        self,
+        links: List[Link],
+        fallback: PingEngine = None,
+        neighbors: NeighborTable = None,
+        rate: float = 5000,
+        timeout: float = 0.2,
+        retries: int = 1,
+        socket_factory: Callable[[str], LinkSocket] = LinkSocket,
+    ):
+        self.links = links
+        self.fallback = fallback or PingEngine()
+        self.neighbors = neighbors
+        self.rate = rate
+        self.timeout = timeout
+        self.retries = retries
+        self.socket_factory = socket_factory
+        self.requests = 0
+        self.elapsed = 0.0
+        self._sockets = {}
+        # Незавершенные опросы каждого интерфейса: (адреса, ответы).
+        self._waiters: Dict[str, List[tuple]] = {}
+
+    @property
+    def probes_per_second(self) -> float:
+        probes = self.requests + self.fallback.probes
+        elapsed = self.elapsed + self.fallback.elapsed
+        return probes / elapsed if elapsed else 0.0
+
+    def link_for(self, address: int) -> Optional[Link]:
+        for link in self.links:
+            first, last = link.hosts
+            if first <= address <= last:
+                return link
+        return None
+
+    def _socket(self, name: str) -> LinkSocket:
+        sock = self._sockets.get(name)
+        if sock is None:
+            sock = self._sockets[name] = self.socket_factory(name)
+        return sock
+
+    async def sweep(self, addresses: List[int]) -> List[int]:
+        """
+        Возвращает ответившие адреса в исходном порядке.
+        """
+        # Сети одного интерфейса опрашиваются через один сокет, поэтому
+        # адреса группируются по имени интерфейса, а не по сети.
+        by_name: Dict[str, Dict[int, int]] = {}
+        routed = []
+        for address in addresses:
+            link = self.link_for(address)
+            if link is None:
+                routed.append(address)
+            else:
+                by_name.setdefault(link.name, {})[address] = int(
+                    link.interface.ip
+                )
+        sweeps = [self._sweep_link(*item) for item in by_name.items()]
+        if routed:
+            sweeps.append(self._sweep_routed(routed))
+        alive = {}
+        for result in await asyncio.gather(*sweeps):
+            alive.update(result)
+        if self.neighbors is not None:
+            self.neighbors.learn(
+                {
+                    format_address(address): format_mac(mac)
+                    for address, mac in alive.items()
+                    if mac is not None
+                }
+            )
+        return [address for address in addresses if address in alive]
+
+    async def _sweep_routed(self, addresses: List[int]) -> Dict[int, None]:
+        return dict.fromkeys(await self.fallback.sweep(addresses))
+
+    async def _sweep_link(
+        self, name: str, senders: Dict[int, int]
+    ) -> Dict[int, int]:
+        """
+        Опрос адресов интерфейса name, senders: адрес -> ip интерфейса в
+        сети адреса. Возвращает ответившие адреса и их mac.
+        """
+        started = time.perf_counter()
+        sock = self._socket(name)
+        answers = {}
+        waiter = (senders, answers)
+        waiters = self._waiters.setdefault(name, [])
+        loop = asyncio.get_running_loop()
+        if not waiters:
+            loop.add_reader(sock.fileno(), self._receive, sock, waiters)
+        waiters.append(waiter)
+        try:
+            targets = list(senders)
+            for attempt in range(self.retries + 1):
+                await self._send(sock, senders, targets)
+                await asyncio.sleep(self.timeout * 2**attempt)
+                targets = [item for item in targets if item not in answers]
+                if not targets:
+                    break
+        finally:
+            waiters.remove(waiter)
+            if not waiters:
+                loop.remove_reader(sock.fileno())
+        elapsed = time.perf_counter() - started
+        self.elapsed += elapsed
+        metrics.PROBED.inc(len(senders))
+        metrics.ALIVE.inc(len(answers))
+        metrics.PING_SECONDS.observe(elapsed)
+        logger.debug(
+            "ARP sweep %s: %s alive of %s",
+            name,
+            len(answers),
+            len(senders),
+        )
+        return answers
+
+    @staticmethod
+    def _receive(sock: LinkSocket, waiters: List[tuple]):
+        """
+        Чтение ответов сокета, один обработчик на сокет: ответ достается
+        всем опросам интерфейса, ожидающим этот адрес.
+        """
+        while True:
+            try:
+                frame = sock.recv(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            packet = parse_frame(frame)
+            if packet is None or packet.operation != ARP_REPLY:
+                continue
+            mac = int.from_bytes(packet.sender_mac, "big")
+            for senders, answers in waiters:
+                if packet.sender_ip in senders:
+                    answers[packet.sender_ip] = mac
+
+    async def _send(
+        self, sock: LinkSocket, senders: Dict[int, int], targets: List[int]
+    ):
+        burst = max(1, int(self.rate // 100))
+        for index, target in enumerate(targets, 1):
+            frame = build_frame(ARP_REQUEST, sock.mac, senders[target], target)
+            while True:
+                try:
+                    sock.send(frame)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(0.001)
+            if index % burst == 0:
+                await asyncio.sleep(burst / self.rate)
+        self.requests += len(targets)
+        metrics.ARP_REQUESTS.inc(len(targets))
+
+    def close(self):
+        for sock in self._sockets.values():
+            sock.close()
+        self._sockets = {}
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import resource
+import time
+
+from . import metrics
+
+logger = logging.getLogger("scanner")
+
+# Оценка памяти на одно устройство в обработке: строка порции
+# (chunk.DeviceChunk), корутина и ответ dns, запись для COPY/INSERT.
+DEVICE_BYTES = 1024
+
+
+def peak_rss() -> int:
+    """
+    Пиковый размер резидентной памяти процесса, байты.
+    """
+    # В Linux ru_maxrss в килобайтах.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    metrics.PEAK_RSS.set(rss)
+    return rss
+
+
+class MemoryBudget:
+    """
+    Ограничение памяти под устройства между опросом и записью в БД.
+        Этап пинга занимает бюджет под найденные устройства порции до того,
+        как передать ее дальше, объект записи (db.writer.ScanWriter)
+        освобождает его после записи порции. Когда бюджет исчерпан, этап
+        пинга ждет и не берет новые адреса из AddressStream, поэтому
+        медленная БД замедляет опрос, а не увеличивает очереди. Порция
+        больше всего бюджета пропускается, если других в обработке нет.
+    Параметры
+        limit - бюджет, байты.
+        device_bytes - оценка памяти на одно устройство.
+    Пример
+        budget = MemoryBudget(64 * 2**20)
+        devices = Devices(budget=budget)
+        writer = ScanWriter(budget=budget)
+    """
+
+    def __init__(self, limit: int, device_bytes: int = DEVICE_BYTES):
+        self.limit = limit
+        self.devices = max(1, limit // device_bytes)
+        self.in_flight = 0
+        self.peak = 0
+        self.waited = 0.0
+        self._condition = None
+
+    def _fits(self, count: int) -> bool:
+        return not self.in_flight or self.in_flight + count <= self.devices
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self, count: int):
+        async with self.condition:
+            if not self._fits(count):
+                started = time.perf_counter()
+                await self.condition.wait_for(lambda: self._fits(count))
+                waited = time.perf_counter() - started
+                self.waited += waited
+                metrics.BUDGET_WAIT_SECONDS.inc(waited)
+            self.in_flight += count
+            self.peak = max(self.peak, self.in_flight)
+            metrics.IN_FLIGHT.set(self.in_flight)
+
+    async def release(self, count: int):
+        async with self.condition:
+            self.in_flight -= count
+            metrics.IN_FLIGHT.set(self.in_flight)
+            self.condition.notify_all()
+
+    def report(self):
+        logger.info(
+            "Memory budget %.1f MiB (%s devices): peak %s devices in "
+            "flight, waited %.1f s",
+            self.limit / 2**20,
+            self.devices,
+            self.peak,
+            self.waited,
+        )
@@ -0,0 +1,139 @@
+from array import array
+from typing import Iterable, Iterator, List, Tuple
+
+from utils import utils
+
+from .neighbors import NOT_AVAILABLE
+from .ranges import format_address, parse_address
+from .vendors import OUIIndex
+
+# Значение столбца macs для адресов без mac (вне 48-битного диапазона).
+NO_MAC = 1 << 48
+
+
+def mac_to_value(mac: str) -> int:
+    try:
+        return OUIIndex.mac_to_int(mac)
+    except (ValueError, AttributeError):
+        return NO_MAC
+
+
+def format_mac(value: int) -> str:
+    if value == NO_MAC:
+        return NOT_AVAILABLE
+    digits = f"{value:012x}"
+    return ":".join(digits[i : i + 2] for i in range(0, 12, 2))
+
+
+class DeviceChunk:
+    """
+    Порция устройств в виде столбцов.
+        Вместо словаря на каждое устройство порция хранит четыре столбца:
+        ips - адреса (array('I')), macs - 48-битные mac-адреса (array('Q'),
+        NO_MAC - mac неизвестен), hostnames - имена хостов, vendors -
+        вендоры (строки из индекса вендоров, общие для всех порций).
+        Строковые представления адресов собираются только при чтении
+        (addresses, rows). position - курсор ranges.AddressStream после
+        адресов порции (для продолжения сканирования), None - неизвестен.
+    Пример
+        chunk = DeviceChunk([3232235777])
+        chunk.set_macs(["00:1a:2b:3c:4d:5e"])
+        for ip, mac, vendor, hostname in chunk.rows():
+            ...
+    """
+
+    __slots__ = ("ips", "macs", "hostnames", "vendors", "position")
+
+    def __init__(
+        self,
+        ips: Iterable[int] = (),
+        macs: Iterable[int] = (),
+        hostnames: List[str] = None,
+        vendors: List[str] = None,
+        position: int = None,
+    ):
+        self.ips = array("I", ips)
+        self.macs = array("Q", macs)
+        self.hostnames = hostnames if hostnames is not None else []
+        self.vendors = vendors if vendors is not None else []
+        self.position = position
+
+    @classmethod
+    def from_columns(
+        cls,
+        ip: List[str],
+        mac: List[str],
+        hostname: List[str],
+        vendor: List[str],
+    ) -> "DeviceChunk":
+        """
+        Порция из строковых столбцов (формат utils.to_lists_of_dicts).
+        """
+        chunk = cls(
+            map(parse_address, ip), map(mac_to_value, mac), hostname, vendor
+        )
+        chunk.check()
+        return chunk
+
+    def __len__(self):
+        return len(self.ips)
+
+    def __repr__(self):
+        return f"DeviceChunk({len(self)} devices)"
+
+    def check(self, complete: bool = True):
+        """
+        Проверка длин столбцов.
+            complete - порция прошла все этапы: каждый столбец должен быть
+            длины ips (пустой столбец непустой порции - ошибка этапа, rows
+            вернул бы ноль строк). Без complete пропускаются пустые
+            (еще не заполненные) столбцы.
+        """
+        lengths = [len(self.ips)] + [
+            len(column)
+            for column in (self.macs, self.hostnames, self.vendors)
+            if complete or column
+        ]
+        utils.check_inequality(*lengths)
+
+    def set_macs(self, macs: Iterable[str]):
+        self.macs = array("Q", map(mac_to_value, macs))
+
+    def addresses(self) -> List[str]:
+        return list(map(format_address, self.ips))
+
+    def rows(self) -> Iterator[Tuple[str, str, str, str]]:
+        """
+        Строки (ip, mac, vendor, hostname) для записи в БД.
+        """
+        return zip(
+            map(format_address, self.ips),
+            map(format_mac, self.macs),
+            self.vendors,
+            self.hostnames,
+        )
+
+    def to_message(self) -> dict:
+        """
+        Порция для передачи через брокер (сериализация json).
+        """
+        return {
+            "ips": self.ips.tolist(),
+            "macs": self.macs.tolist(),
+            "hostnames": self.hostnames,
+            "vendors": self.vendors,
+            "position": self.position,
+        }
+
+    @classmethod
+    def from_message(cls, message: dict) -> "DeviceChunk":
+        return cls(**message)
+
+    def to_dicts(self) -> List[dict]:
+        """
+        Прежний формат порции - список словарей.
+        """
+        return [
+            {"ip": ip, "mac": mac, "vendor": vendor, "hostname": hostname}
+            for ip, mac, vendor, hostname in self.rows()
+        ]
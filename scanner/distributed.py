@@ -0,0 +1,332 @@
+import asyncio
+import logging
+import socket
+import time
+import uuid
+from typing import List, Optional
+
+from kombu import Connection
+
+from . import settings
+from .chunk import DeviceChunk
+from .dns_cache import HostnameCache
+from .ping import PingEngine
+from .ranges import AddressStream, HostRange
+from .scanner import STAGE_LIMITS, Devices
+
+logger = logging.getLogger("scanner")
+
+WORK_QUEUE = "netscan.work"
+RESULT_QUEUE = "netscan.results"
+# Очередь результатов, которую никто не читает, удаляется брокером не
+# раньше чем через это время (x-expires), секунды.
+RESULT_QUEUE_MIN_EXPIRES = 60
+
+
+def results_queue(connection: Connection, name: str, expires: float):
+    """
+    Очередь результатов прохода: координатор и агенты объявляют ее с
+    одинаковыми параметрами.
+    """
+    return connection.SimpleQueue(
+        name, queue_args={"x-expires": int(expires * 1000)}
+    )
+
+
+def make_units(
+    networks: List[HostRange],
+    chunk_size: int,
+    unit_chunks: int,
+    seed: int = None,
+) -> List[List[int]]:
+    """
+    Деление нумерации адресов (ranges.AddressStream.size) на части по
+    chunk_size * unit_chunks номеров, как в sharding.ShardedDevices.
+    """
+    unit_size = chunk_size * unit_chunks
+    size = AddressStream(networks, seed=seed).size
+    return [[start, start + unit_size] for start in range(0, size, unit_size)]
+
+
+class Coordinator:
+    """
+    Распределенный поиск устройств: координатор.
+        Нумерация адресов делится на части (make_units), части ставятся в
+        очередь WORK_QUEUE брокера. Агенты (ScanAgent) на других узлах
+        сканируют части и возвращают порции в очередь результатов этого
+        прохода. Координатор отдает порции по мере поступления, поэтому
+        результаты всех агентов записываются под одним id сканирования
+        (scanner_run.ascan_and_commit(devices=coordinator)). Повторный
+        результат части (после сбоя агента часть выдается заново)
+        пропускается. Порядок порций между частями не сохраняется.
+        Очередь результатов объявляется с x-expires и удаляется брокером,
+        если координатор пропал; части прохода, оставшиеся в WORK_QUEUE
+        после его завершения, агенты отбрасывают.
+    Параметры
+        broker_url - адрес брокера kombu, например amqp://... или memory://
+            (только агенты в том же процессе).
+        unit_chunks - размер части в порциях.
+        timeout - сколько секунд ждать очередного результата.
+        transport_options - параметры транспорта kombu (например,
+            polling_interval для memory://).
+        остальные параметры как у Devices (exclude, subs, exclude_subs,
+            networks, chunk_size, seed).
+    Пример
+        coordinator = Coordinator(subs=['10.0.0.0/12'])
+        await scanner_run.ascan_and_commit(devices=coordinator)
+    """
+
+    def __init__(
+        self,
+        broker_url: str = settings.BROKER_URL,
+        unit_chunks: int = 16,
+        timeout: float = settings.AGENT_TIMEOUT,
+        transport_options: dict = None,
+        **kwargs,
+    ):
+        self.broker_url = broker_url
+        self.transport_options = transport_options
+        self.timeout = timeout
+        self.expires = max(2 * timeout, RESULT_QUEUE_MIN_EXPIRES)
+        self.networks = kwargs.get("networks")
+        if self.networks is None:
+            self.networks = Devices.get_networks(
+                kwargs.get("exclude", None),
+                kwargs.get("subs", None),
+                kwargs.get("exclude_subs", None),
+            )
+        self.chunk_size = kwargs.get("chunk_size", 300)
+        self.seed = kwargs.get("seed", None)
+        self.units = make_units(
+            self.networks, self.chunk_size, unit_chunks, self.seed
+        )
+        self.agents = set()
+        self._token = uuid.uuid4().hex
+        self._done = set()
+        self._connection = None
+        self._results = None
+        self._chunks = iter(())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> DeviceChunk:
+        loop = asyncio.get_running_loop()
+        chunk = await loop.run_in_executor(None, self._next_or_none)
+        if chunk is None:
+            raise StopAsyncIteration
+        return chunk
+
+    def _next_or_none(self) -> Optional[DeviceChunk]:
+        try:
+            return self.next_chunk()
+        except StopIteration:
+            return None
+
+    def publish(self):
+        """
+        Постановка частей в очередь агентов.
+        """
+        self._connection = Connection(
+            self.broker_url, transport_options=self.transport_options
+        )
+        reply_to = f"{RESULT_QUEUE}.{self._token}"
+        self._results = results_queue(self._connection, reply_to, self.expires)
+        networks = [[item.first, item.last] for item in self.networks]
+        with self._connection.SimpleQueue(WORK_QUEUE) as work:
+            for index, span in enumerate(self.units):
+                work.put(
+                    {
+                        "scan": self._token,
+                        "unit": index,
+                        "networks": networks,
+                        "chunk_size": self.chunk_size,
+                        "seed": self.seed,
+                        "span": span,
+                        "reply_to": reply_to,
+                        "expires": self.expires,
+                    },
+                    serializer="json",
+                )
+        logger.info("Distributed scan: %s units queued", len(self.units))
+
+    def next_chunk(self) -> DeviceChunk:
+        if self._connection is None:
+            self.publish()
+        while True:
+            chunk = next(self._chunks, None)
+            if chunk is not None:
+                return chunk
+            if len(self._done) == len(self.units):
+                logger.info(
+                    "Distributed scan: %s units from %s agents",
+                    len(self.units),
+                    len(self.agents),
+                )
+                self.close()
+                raise StopIteration
+            self._chunks = iter(self._receive())
+
+    def _receive(self) -> List[DeviceChunk]:
+        try:
+            message = self._results.get(timeout=self.timeout)
+        except self._results.Empty:
+            self.close()
+            raise TimeoutError(
+                f"No results from agents for {self.timeout} s, "
+                f"{len(self.units) - len(self._done)} units left"
+            )
+        message.ack()
+        result = message.payload
+        if result["unit"] in self._done:
+            logger.debug("Duplicate result for unit %s", result["unit"])
+            return []
+        self._done.add(result["unit"])
+        self.agents.add(result["agent"])
+        return [DeviceChunk.from_message(item) for item in result["chunks"]]
+
+    def close(self):
+        if self._connection is not None:
+            self._results.queue.delete()
+            self._results.close()
+            self._connection.release()
+            self._connection = None
+
+
+class ScanAgent:
+    """
+    Распределенный поиск устройств: агент.
+        Берет части из очереди WORK_QUEUE по одной, сканирует их (Devices в
+        одном цикле событий с общими движком пинга и кэшем имен хостов) и
+        отправляет порции части одним сообщением в очередь результатов
+        координатора. Часть подтверждается после отправки результата,
+        поэтому при сбое агента брокер выдаст ее другому. Часть, очереди
+        результатов которой уже нет (координатор завершился или пропал),
+        подтверждается без сканирования.
+    Параметры
+        broker_url - адрес брокера kombu.
+        name - имя агента в результатах, по умолчанию имя хоста.
+        transport_options - параметры транспорта kombu.
+        остальные параметры передаются в Devices (limits, queue_size,
+            ping_engine, neighbors, resolver, vendor_index, ...).
+    Пример
+        ScanAgent().run()
+    """
+
+    def __init__(
+        self,
+        broker_url: str = settings.BROKER_URL,
+        name: str = None,
+        transport_options: dict = None,
+        **options,
+    ):
+        self.broker_url = broker_url
+        self.transport_options = transport_options
+        self.name = name or socket.gethostname()
+        self.units = 0
+        self.busy = 0.0
+        limits = {**STAGE_LIMITS, **options.get("limits", {})}
+        self._options = {
+            "ping_engine": PingEngine(concurrency=limits["ping"]),
+            "dns_cache": HostnameCache(
+                maxsize=settings.DNS_CACHE_SIZE,
+                negative_ttl=settings.DNS_NEGATIVE_TTL,
+                path=settings.DNS_CACHE_PATH,
+            ),
+            **options,
+        }
+        self._loop = None
+
+    def scan_unit(self, unit: dict) -> List[DeviceChunk]:
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        devices = Devices(
+            networks=[HostRange(*item) for item in unit["networks"]],
+            chunk_size=unit["chunk_size"],
+            seed=unit["seed"],
+            span=tuple(unit["span"]),
+            **self._options,
+        )
+        return self._loop.run_until_complete(self._collect(devices))
+
+    @staticmethod
+    async def _collect(devices: Devices) -> List[DeviceChunk]:
+        return [chunk async for chunk in devices]
+
+    def run(self, max_units: int = None, idle_timeout: float = None) -> int:
+        """
+        Обработка частей до остановки.
+            Возвращает число обработанных частей. Завершается после
+            max_units частей или если очередь пуста idle_timeout секунд.
+        """
+        logger.info("Agent %s started", self.name)
+        with Connection(
+            self.broker_url, transport_options=self.transport_options
+        ) as connection:
+            work = connection.SimpleQueue(WORK_QUEUE)
+            work.consumer.qos(prefetch_count=1)
+            try:
+                while max_units is None or self.units < max_units:
+                    try:
+                        message = work.get(timeout=idle_timeout)
+                    except work.Empty:
+                        break
+                    self._handle(connection, message)
+            finally:
+                work.close()
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+        logger.info("Agent %s stopped, units %s", self.name, self.units)
+        return self.units
+
+    @staticmethod
+    def _expecting(connection: Connection, reply_to: str) -> bool:
+        """
+        Есть ли еще очередь результатов координатора.
+        """
+        channel = connection.channel()
+        try:
+            channel.queue_declare(queue=reply_to, passive=True)
+            return True
+        except connection.channel_errors:
+            return False
+        finally:
+            channel.close()
+
+    def _handle(self, connection: Connection, message):
+        unit = message.payload
+        if not self._expecting(connection, unit["reply_to"]):
+            logger.info(
+                "Agent %s: dropped unit %s of finished scan %s",
+                self.name,
+                unit["unit"],
+                unit["scan"],
+            )
+            message.ack()
+            return
+        started = time.perf_counter()
+        chunks = self.scan_unit(unit)
+        with results_queue(
+            connection,
+            unit["reply_to"],
+            unit.get("expires", RESULT_QUEUE_MIN_EXPIRES),
+        ) as results:
+            results.put(
+                {
+                    "scan": unit["scan"],
+                    "unit": unit["unit"],
+                    "agent": self.name,
+                    "chunks": [chunk.to_message() for chunk in chunks],
+                },
+                serializer="json",
+            )
+        message.ack()
+        self.units += 1
+        self.busy += time.perf_counter() - started
+        logger.debug(
+            "Agent %s: unit %s, %s devices",
+            self.name,
+            unit["unit"],
+            sum(map(len, chunks)),
+        )
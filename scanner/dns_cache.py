@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger("scanner")
+
+NOT_AVAILABLE = "N/A"
+
+
+class HostnameCache:
+    """
+    Кэш обратных dns-записей с ограничением размера (LRU).
+        Положительные ответы хранятся TTL записи (или default_ttl, если TTL
+        неизвестен), отрицательные - negative_ttl секунд. Если указан path,
+        кэш читается из файла при создании и записывается методом save, так
+        что перезапуск планировщика не начинает с пустого кэша. Записи,
+        добавленные после последнего вызова changes, возвращаются им (для
+        объединения кэшей процессов в sharding.ShardedDevices).
+        Счетчики hits и misses показывают эффективность кэша.
+    Пример
+        cache = HostnameCache(maxsize=10000, path="dns_cache.json")
+        cache.get("192.168.1.1")
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 65536,
+        default_ttl: float = 3600,
+        negative_ttl: float = 300,
+        path: str = None,
+    ):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._changed = set()
+        if path:
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, ip: str) -> Optional[str]:
+        """
+        Возвращает имя хоста (или NOT_AVAILABLE для отрицательной записи),
+        None - если записи нет или она устарела.
+        """
+        entry = self._entries.get(ip)
+        if entry is not None:
+            hostname, expires = entry
+            if expires > time.time():
+                self._entries.move_to_end(ip)
+                self.hits += 1
+                return hostname
+            del self._entries[ip]
+        self.misses += 1
+        return None
+
+    def set(self, ip: str, hostname: str, ttl: float = None):
+        if ttl is None:
+            ttl = self.default_ttl
+        self._entries[ip] = (hostname, time.time() + ttl)
+        self._entries.move_to_end(ip)
+        self._changed.add(ip)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def set_negative(self, ip: str):
+        self.set(ip, NOT_AVAILABLE, self.negative_ttl)
+
+    def entries(self) -> Dict[str, Tuple[str, float]]:
+        """
+        Неустаревшие записи: ip -> (имя хоста, время устаревания).
+        """
+        now = time.time()
+        return {
+            ip: entry for ip, entry in self._entries.items() if entry[1] > now
+        }
+
+    def changes(self) -> Dict[str, Tuple[str, float]]:
+        """
+        Записи, добавленные после предыдущего вызова.
+        """
+        changed = {
+            ip: self._entries[ip]
+            for ip in self._changed
+            if ip in self._entries
+        }
+        self._changed = set()
+        return changed
+
+    def update(self, entries: Dict[str, Tuple[str, float]]):
+        """
+        Добавление записей другого кэша (entries или changes).
+        """
+        now = time.time()
+        for ip, (hostname, expires) in entries.items():
+            if expires > now:
+                self._entries[ip] = (hostname, expires)
+                self._entries.move_to_end(ip)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.exception("DNS cache %s is not readable.", self.path)
+            return
+        self.update(entries)
+
+    def save(self):
+        if not self.path:
+            return
+        # Свой временный файл: кэш могут сохранять несколько процессов.
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.entries(), f)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def stats(self) -> dict:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,139 @@
+import logging
+from typing import Dict, Iterable, List, Set, Tuple
+
+from .ranges import HostRange, RangeSet, format_address
+
+logger = logging.getLogger("scanner")
+
+
+class HotSet:
+    """
+    Множество недавно активных адресов для частого опроса.
+        Адрес попадает в множество, когда ответил при полном проходе (или
+        найден в последних сканированиях в БД). При частом опросе адрес,
+        не ответивший max_misses раз подряд, считается пропавшим и
+        удаляется из множества до следующего обнаружения.
+    Пример
+        hot = HotSet(max_misses=3)
+        hot.add_many([3232235777])
+        dropped, returned = hot.update(probed, alives)
+    """
+
+    def __init__(self, max_misses: int = 3):
+        self.max_misses = max_misses
+        self._misses: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self._misses)
+
+    def __contains__(self, address: int) -> bool:
+        return address in self._misses
+
+    @property
+    def addresses(self) -> List[int]:
+        return sorted(self._misses)
+
+    def add_many(self, addresses: Iterable[int]):
+        for address in addresses:
+            self._misses[address] = 0
+
+    def update(
+        self, probed: Iterable[int], alives: Iterable[int]
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Учет результатов опроса.
+            Возвращает пропавшие адреса и адреса, снова ответившие после
+            пропусков.
+        """
+        alives = set(alives)
+        dropped = []
+        returned = []
+        for address in probed:
+            misses = self._misses.get(address)
+            if misses is None:
+                continue
+            if address in alives:
+                if misses:
+                    returned.append(address)
+                self._misses[address] = 0
+            elif misses + 1 >= self.max_misses:
+                del self._misses[address]
+                dropped.append(address)
+            else:
+                self._misses[address] = misses + 1
+        for address in dropped:
+            logger.info("Host %s dropped off.", format_address(address))
+        return dropped, returned
+
+
+class DarkBlocks:
+    """
+    Экспоненциальная отсрочка опроса "темных" блоков адресов.
+        Адреса группируются в блоки по 2^block_bits (по умолчанию /24).
+        Блок, в котором никто не ответил dark_after полных проходов подряд,
+        пропускается в следующих 1, 2, 4, ... проходах (не более
+        max_backoff). Любой ответивший адрес сбрасывает отсрочку блока.
+    Пример
+        dark = DarkBlocks()
+        networks = dark.active(networks)
+        ...
+        dark.record(networks, alives)
+    """
+
+    def __init__(
+        self,
+        block_bits: int = 8,
+        dark_after: int = 3,
+        max_backoff: int = 64,
+    ):
+        self.block_bits = block_bits
+        self.dark_after = dark_after
+        self.max_backoff = max_backoff
+        self._dark: Dict[int, List[int]] = {}
+
+    def __len__(self):
+        return len(self._dark)
+
+    def _blocks(self, networks: Iterable[HostRange]) -> Set[int]:
+        blocks = set()
+        for first, last in networks:
+            blocks.update(
+                range(first >> self.block_bits, (last >> self.block_bits) + 1)
+            )
+        return blocks
+
+    def _block_range(self, block: int) -> HostRange:
+        first = block << self.block_bits
+        return HostRange(first, first + (1 << self.block_bits) - 1)
+
+    def active(self, networks: Iterable[HostRange]) -> List[HostRange]:
+        """
+        Диапазоны без блоков, опрос которых отложен.
+            Каждый вызов считается проходом: отсрочки уменьшаются на один.
+        """
+        networks = RangeSet(networks)
+        skipped = []
+        for block in self._blocks(networks):
+            state = self._dark.get(block)
+            if state is not None and state[1] > 0:
+                state[1] -= 1
+                skipped.append(self._block_range(block))
+        if skipped:
+            logger.debug("Dark blocks skipped: %s", len(skipped))
+        return list(networks.subtract(skipped))
+
+    def record(self, networks: Iterable[HostRange], alives: Iterable[int]):
+        """
+        Учет результатов полного прохода по диапазонам networks.
+        """
+        alive_blocks = {address >> self.block_bits for address in alives}
+        for block in self._blocks(networks):
+            if block in alive_blocks:
+                self._dark.pop(block, None)
+                continue
+            state = self._dark.setdefault(block, [0, 0])
+            state[0] += 1
+            if state[0] >= self.dark_after:
+                state[1] = min(
+                    2 ** (state[0] - self.dark_after), self.max_backoff
+                )
@@ -0,0 +1,67 @@
+"""
+Метрики сканирования в формате Prometheus.
+    Метрики обновляются один раз на порцию (кроме промахов arp и запросов
+    dns, которые считаются по одному), поэтому почти не влияют на скорость
+    опроса. Доля активных адресов - отношение скоростей
+    netscan_alive_addresses_total и netscan_probed_addresses_total.
+    Метрики записи в БД - в db.metrics.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+_SLOW_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+PROBED = Counter(
+    "netscan_probed_addresses_total", "Addresses swept by the ping stage"
+)
+PROBES = Counter(
+    "netscan_icmp_probes_total", "ICMP requests sent, including retries"
+)
+ALIVE = Counter("netscan_alive_addresses_total", "Addresses that answered")
+PING_SECONDS = Histogram(
+    "netscan_ping_seconds", "Ping sweep time per chunk", buckets=_SLOW_BUCKETS
+)
+ARP_REQUESTS = Counter(
+    "netscan_arp_requests_total", "ARP requests sent by the ARP sweep"
+)
+ARP_MISSES = Counter(
+    "netscan_arp_misses_total", "Addresses missing from the ARP snapshot"
+)
+DNS_SECONDS = Histogram(
+    "netscan_dns_seconds", "PTR query time for cache misses"
+)
+DNS_ERRORS = Counter(
+    "netscan_dns_errors_total", "Failed PTR queries", ["reason"]
+)
+VENDOR_MISSES = Counter(
+    "netscan_vendor_misses_total", "MAC addresses with unknown vendor"
+)
+STAGE_SECONDS = Histogram(
+    "netscan_stage_seconds",
+    "Chunk processing time per pipeline stage",
+    ["stage"],
+    buckets=_SLOW_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "netscan_devices_in_flight",
+    "Devices between the ping stage and the database write",
+)
+BUDGET_WAIT_SECONDS = Counter(
+    "netscan_budget_wait_seconds_total",
+    "Time the ping stage waited for the memory budget",
+)
+PEAK_RSS = Gauge("netscan_peak_rss_bytes", "Peak resident set size")
+CHUNK_SECONDS = Histogram(
+    "netscan_chunk_seconds",
+    "Chunk end-to-end time from address generation to output",
+    buckets=_SLOW_BUCKETS,
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    """
+    Наблюдатель для pipeline.Pipeline.
+    """
+    if stage == "chunk":
+        CHUNK_SECONDS.observe(seconds)
+    else:
+        STAGE_SECONDS.labels(stage).observe(seconds)
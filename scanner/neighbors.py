@@ -0,0 +1,100 @@
+import logging
+import time
+from typing import Dict, Iterable, List
+
+import arpreq
+from log_settings.handlers import SAMPLED
+
+from . import metrics
+
+logger = logging.getLogger("scanner")
+
+ARP_TABLE_PATH = "/proc/net/arp"
+NOT_AVAILABLE = "N/A"
+# Флаг ATF_COM: запись arp-кэша заполнена.
+_ATF_COM = 0x2
+
+
+class NeighborTable:
+    """
+    Снимок таблицы соседей ядра (arp-кэша).
+        Таблица читается из path одним чтением, адреса затем берутся из
+        снимка. Снимок обновляется, если он старше max_age секунд
+        (0 - при каждом обращении к lookup_many). Для адресов, которых нет в
+        снимке, выполняется ioctl через arpreq. Адреса, полученные из
+        ответов ARP (learn, см. arp.ArpEngine), берутся раньше снимка и не
+        сбрасываются при его обновлении.
+    Пример
+        table = NeighborTable()
+        table.lookup_many(["192.168.1.1", "192.168.1.2"])
+        # снимок в формате /proc/net/arp, без ioctl
+        table = NeighborTable(path="arp_snapshot.txt", fallback=False)
+    """
+
+    def __init__(
+        self,
+        path: str = ARP_TABLE_PATH,
+        max_age: float = 0,
+        fallback: bool = True,
+    ):
+        self.path = path
+        self.max_age = max_age
+        self.fallback = fallback
+        self.misses = 0
+        self._macs = {}
+        self._learned = {}
+        self._updated = None
+
+    @staticmethod
+    def parse(lines: Iterable[str]) -> Dict[str, str]:
+        """
+        Разбор таблицы в формате /proc/net/arp.
+        """
+        macs = {}
+        lines = iter(lines)
+        next(lines, None)
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 4:
+                continue
+            ip, _, flags, mac = fields[:4]
+            try:
+                complete = int(flags, 16) & _ATF_COM
+            except ValueError:
+                continue
+            if complete:
+                macs[ip] = mac
+        return macs
+
+    def refresh(self):
+        try:
+            with open(self.path) as f:
+                self._macs = self.parse(f)
+        except OSError:
+            logger.exception("Neighbor table %s is not readable.", self.path)
+            self._macs = {}
+        self._updated = time.monotonic()
+
+    def _is_stale(self) -> bool:
+        if self._updated is None:
+            return True
+        return time.monotonic() - self._updated >= self.max_age
+
+    def learn(self, macs: Dict[str, str]):
+        self._learned.update(macs)
+
+    def lookup(self, ip: str) -> str:
+        mac = self._learned.get(ip) or self._macs.get(ip)
+        if mac is not None:
+            return mac
+        self.misses += 1
+        metrics.ARP_MISSES.inc()
+        logger.debug("No ARP entry for %s", ip, extra=SAMPLED)
+        if self.fallback:
+            mac = arpreq.arpreq(ip)
+        return mac or NOT_AVAILABLE
+
+    def lookup_many(self, ips: Iterable) -> List[str]:
+        if self._is_stale():
+            self.refresh()
+        return [self.lookup(str(ip)) for ip in ips]
@@ -0,0 +1,147 @@
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from icmplib import async_ping
+from utils import utils
+
+from . import metrics
+from .ranges import format_address
+
+logger = logging.getLogger("scanner")
+
+
+class PingEngine:
+    """
+    Адаптивный icmp-опрос адресов.
+        Для каждой подсети /24 ведется сглаженная оценка RTT (как в TCP:
+        srtt и rttvar), из нее вычисляется таймаут ответа. Не ответившие
+        адреса опрашиваются повторно (retries раз) с удвоенным таймаутом.
+        Доля адресов, ответивших только на повтор, считается потерями:
+        при потерях выше loss_threshold число одновременных запросов
+        уменьшается вдвое, иначе постепенно растет.
+    Параметры
+        concurrency - начальное число одновременных запросов.
+        timeout - таймаут для подсетей без оценки RTT, секунды.
+        retries - число повторных опросов не ответивших адресов.
+        ping_func - функция опроса с интерфейсом icmplib.async_ping
+            (например, имитация сети в benchmarks.simulation).
+    Пример
+        engine = PingEngine(concurrency=200)
+        alives = await engine.sweep([3232235777, 3232235778])
+        engine.probes_per_second
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 200,
+        min_concurrency: int = 16,
+        max_concurrency: int = 2000,
+        timeout: float = 1.0,
+        min_timeout: float = 0.05,
+        max_timeout: float = 3.0,
+        retries: int = 1,
+        loss_threshold: float = 0.02,
+        privileged: bool = True,
+        ping_func: Callable[..., Awaitable] = async_ping,
+    ):
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.retries = retries
+        self.loss_threshold = loss_threshold
+        self.privileged = privileged
+        self.ping_func = ping_func
+        self.probes = 0
+        self.elapsed = 0.0
+        self._rtts: Dict[int, List[float]] = {}
+
+    @property
+    def probes_per_second(self) -> float:
+        return self.probes / self.elapsed if self.elapsed else 0.0
+
+    @staticmethod
+    def _subnet(address: int) -> int:
+        return address >> 8
+
+    def timeout_for(self, address: int) -> float:
+        estimate = self._rtts.get(self._subnet(address))
+        if estimate is None:
+            return self.timeout
+        srtt, rttvar = estimate
+        timeout = srtt + 4 * rttvar
+        return min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def _update_rtt(self, address: int, rtt: float):
+        subnet = self._subnet(address)
+        estimate = self._rtts.get(subnet)
+        if estimate is None:
+            self._rtts[subnet] = [rtt, rtt / 2]
+            return
+        srtt, rttvar = estimate
+        estimate[1] = 0.75 * rttvar + 0.25 * abs(srtt - rtt)
+        estimate[0] = 0.875 * srtt + 0.125 * rtt
+
+    def _tune(self, alive: int, recovered: int):
+        if not alive:
+            return
+        loss = recovered / alive
+        if loss > self.loss_threshold:
+            self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+        else:
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + self.concurrency // 4
+            )
+
+    async def _probe(self, address: int, factor: float) -> bool:
+        host = await self.ping_func(
+            format_address(address),
+            count=1,
+            timeout=self.timeout_for(address) * factor,
+            privileged=self.privileged,
+        )
+        if host.is_alive:
+            self._update_rtt(address, host.avg_rtt / 1000)
+        return host.is_alive
+
+    async def _probe_all(self, addresses: List[int], factor: float) -> list:
+        self.probes += len(addresses)
+        metrics.PROBES.inc(len(addresses))
+        return await utils.gather_limited(
+            (self._probe(address, factor) for address in addresses),
+            self.concurrency,
+        )
+
+    async def sweep(self, addresses: List[int]) -> List[int]:
+        """
+        Возвращает ответившие адреса в исходном порядке.
+        """
+        started = time.perf_counter()
+        results = await self._probe_all(addresses, 1)
+        alive = dict(zip(addresses, results))
+        first_pass = sum(results)
+        silent = [address for address in addresses if not alive[address]]
+        for attempt in range(self.retries):
+            if not silent:
+                break
+            results = await self._probe_all(silent, 2 ** (attempt + 1))
+            alive.update(zip(silent, results))
+            silent = [address for address in silent if not alive[address]]
+        alives = [address for address in addresses if alive[address]]
+        self._tune(len(alives), len(alives) - first_pass)
+        elapsed = time.perf_counter() - started
+        self.elapsed += elapsed
+        metrics.PROBED.inc(len(addresses))
+        metrics.ALIVE.inc(len(alives))
+        metrics.PING_SECONDS.observe(elapsed)
+        logger.debug(
+            "Sweep: %s alive of %s, concurrency %s, %.0f probes/s",
+            len(alives),
+            len(addresses),
+            self.concurrency,
+            self.probes_per_second,
+        )
+        return alives
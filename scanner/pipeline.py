@@ -0,0 +1,150 @@
+import asyncio
+from collections import deque
+import logging
+import time
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from log_settings import context
+
+logger = logging.getLogger("scanner")
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class Pipeline:
+    """
+    Конвейер этапов сканирования.
+        Источник порций и каждый этап работают в отдельных задачах и связаны
+        ограниченными очередями размера queue_size. Пока порция N проходит
+        обогащение, источник уже готовит порцию N+1. Заполненная очередь
+        приостанавливает предыдущий этап (backpressure). Порядок порций
+        сохраняется, так как каждый этап обрабатывает порции по одной.
+        Порции нумеруются по порядку, номер обрабатываемой порции доступен
+        этапам в log_settings.context.chunk_id (для записей журнала).
+        Время обработки каждой порции каждым этапом (и ожидания порции от
+        источника) записывается в latencies, полное время прохождения
+        порции - в latencies["chunk"].
+    Параметры
+        source - асинхронный итератор порций.
+        stages - список пар (имя, корутина-функция) этапов.
+        queue_size - размер очереди между этапами.
+        source_name - имя источника в latencies.
+        observer - функция (имя, секунды), вызываемая для каждого замера.
+    Пример
+        pipeline = Pipeline(source, [("dns", resolve)], queue_size=2)
+        async for item in pipeline:
+            ...
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator,
+        stages: List[Tuple[str, Callable[..., Awaitable]]],
+        queue_size: int = 2,
+        source_name: str = "source",
+        observer: Optional[Callable[[str, float], None]] = None,
+    ):
+        self._source = source
+        self._stages = stages
+        self._queue_size = queue_size
+        self._source_name = source_name
+        names = [source_name] + [name for name, _ in stages] + ["chunk"]
+        self.latencies: Dict[str, List[float]] = {name: [] for name in names}
+        self._observer = observer
+        self._started = deque()
+        self._tasks = []
+        self._outbox = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._outbox is None:
+            self._start()
+        item = await self._outbox.get()
+        if item is _DONE:
+            raise StopAsyncIteration
+        if isinstance(item, _Failure):
+            await self.aclose()
+            raise item.exc
+        self._record("chunk", time.perf_counter() - self._started.popleft())
+        return item[1]
+
+    def _record(self, name: str, seconds: float):
+        self.latencies[name].append(seconds)
+        if self._observer is not None:
+            self._observer(name, seconds)
+
+    def _start(self):
+        inbox = asyncio.Queue(self._queue_size)
+        self._tasks.append(asyncio.ensure_future(self._produce(inbox)))
+        for name, func in self._stages:
+            outbox = asyncio.Queue(self._queue_size)
+            self._tasks.append(
+                asyncio.ensure_future(self._stage(name, func, inbox, outbox))
+            )
+            inbox = outbox
+        self._outbox = inbox
+
+    async def _produce(self, outbox: asyncio.Queue):
+        index = 0
+        try:
+            started = time.perf_counter()
+            context.chunk_id.set(index)
+            async for item in self._source:
+                self._started.append(started)
+                self._record(self._source_name, time.perf_counter() - started)
+                await outbox.put((index, item))
+                index += 1
+                context.chunk_id.set(index)
+                started = time.perf_counter()
+        except Exception as e:
+            await outbox.put(_Failure(e))
+            return
+        await outbox.put(_DONE)
+
+    async def _stage(
+        self,
+        name: str,
+        func: Callable[..., Awaitable],
+        inbox: asyncio.Queue,
+        outbox: asyncio.Queue,
+    ):
+        while True:
+            item = await inbox.get()
+            if item is _DONE or isinstance(item, _Failure):
+                await outbox.put(item)
+                break
+            index, item = item
+            context.chunk_id.set(index)
+            started = time.perf_counter()
+            try:
+                result = await func(item)
+            except Exception as e:
+                logger.exception("Stage %s failed.", name)
+                await outbox.put(_Failure(e))
+                break
+            self._record(name, time.perf_counter() - started)
+            await outbox.put((index, result))
+
+    async def aclose(self):
+        """
+        Останавливает все задачи конвейера.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,264 @@
+import itertools
+from bisect import bisect_right
+from ipaddress import IPv4Address, IPv4Network
+from socket import inet_aton, inet_ntoa
+from struct import Struct
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+_UINT32 = Struct("!I")
+
+
+def format_address(address: int) -> str:
+    """
+    Строковое представление адреса без создания IPv4Address.
+    """
+    return inet_ntoa(_UINT32.pack(address))
+
+
+def parse_address(address: str) -> int:
+    """
+    Целое представление адреса без создания IPv4Address.
+    """
+    return _UINT32.unpack(inet_aton(address))[0]
+
+
+class HostRange(NamedTuple):
+    """
+    Непрерывный диапазон адресов хостов [first, last] в виде целых чисел.
+    """
+
+    first: int
+    last: int
+
+    @classmethod
+    def from_network(
+        cls, network: IPv4Network, hosts_only: bool = True
+    ) -> "HostRange":
+        """
+        Диапазон адресов подсети.
+            При hosts_only=True без адреса сети и широковещательного адреса,
+            как в IPv4Network.hosts().
+        """
+        first = int(network.network_address)
+        last = int(network.broadcast_address)
+        if hosts_only and network.prefixlen < 31:
+            first, last = first + 1, last - 1
+        return cls(first, last)
+
+    @property
+    def num_addresses(self) -> int:
+        return self.last - self.first + 1
+
+    def split(self, size: int) -> List["HostRange"]:
+        """
+        Деление диапазона на части не более size адресов.
+        """
+        return [
+            HostRange(first, min(first + size - 1, self.last))
+            for first in range(self.first, self.last + 1, size)
+        ]
+
+    def __str__(self):
+        return f"{IPv4Address(self.first)}-{IPv4Address(self.last)}"
+
+
+class RangeSet:
+    """
+    Множество адресов в виде отсортированных непересекающихся диапазонов.
+        Пересекающиеся и смежные диапазоны объединяются сортировкой за
+        O(n log n). Вычитание (subtract) позволяет задать исключения,
+        например "10.0.0.0/8 без 10.1.2.0/24".
+    Пример
+        ranges = RangeSet([HostRange(1, 10), HostRange(5, 20)])
+        ranges.subtract(RangeSet([HostRange(8, 9)]))
+    """
+
+    def __init__(self, ranges: Iterable = ()):
+        self._ranges = self._merge(ranges)
+        self._firsts = [item.first for item in self._ranges]
+
+    @staticmethod
+    def _merge(ranges: Iterable) -> List[HostRange]:
+        merged = []
+        for first, last in sorted(ranges):
+            if merged and first <= merged[-1].last + 1:
+                if last > merged[-1].last:
+                    merged[-1] = HostRange(merged[-1].first, last)
+            else:
+                merged.append(HostRange(first, last))
+        return merged
+
+    def __iter__(self) -> Iterator[HostRange]:
+        return iter(self._ranges)
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def __bool__(self):
+        return bool(self._ranges)
+
+    def __contains__(self, address: int) -> bool:
+        index = bisect_right(self._firsts, int(address)) - 1
+        return index >= 0 and int(address) <= self._ranges[index].last
+
+    def __repr__(self):
+        return f"RangeSet({', '.join(map(str, self._ranges))})"
+
+    @property
+    def num_addresses(self) -> int:
+        return sum(item.num_addresses for item in self._ranges)
+
+    def union(self, other: Iterable) -> "RangeSet":
+        return RangeSet(itertools.chain(self._ranges, other))
+
+    def subtract(self, other: Iterable) -> "RangeSet":
+        """
+        Множество без адресов из other.
+        """
+        excluded = other if isinstance(other, RangeSet) else RangeSet(other)
+        result = []
+        holes = iter(excluded)
+        hole = next(holes, None)
+        for first, last in self._ranges:
+            while hole is not None and hole.last < first:
+                hole = next(holes, None)
+            current = first
+            while hole is not None and hole.first <= last:
+                if hole.first > current:
+                    result.append(HostRange(current, hole.first - 1))
+                current = max(current, hole.last + 1)
+                if hole.last > last:
+                    break
+                hole = next(holes, None)
+            if current <= last:
+                result.append(HostRange(current, last))
+        return RangeSet(result)
+
+
+class AddressStream:
+    """
+    Ленивый поток адресов диапазонов порциями по chunk_size целых чисел.
+        Адреса не материализуются: порция строится из номеров адресов в
+        общей нумерации всех диапазонов, память не зависит от их размера.
+        При заданном seed адреса идут в стабильном псевдослучайном порядке
+        (полнопериодный LCG по модулю 2^k с отбрасыванием номеров вне
+        диапазона), чтобы опрос не нагружал один коммутатор за раз.
+        position - курсор потока, с него можно продолжить: номер адреса,
+        а при seed - число шагов LCG (size = 2^k шагов, шаг за пределами
+        диапазона адреса не дает, поэтому порции могут быть короче
+        chunk_size). Продолжение с position стоит O(log size).
+        stop - курсор, на котором поток заканчивается (для деления на
+        части).
+    Пример
+        stream = AddressStream(ranges, chunk_size=300, seed=42)
+        for chunk in stream:
+            ...
+    """
+
+    def __init__(
+        self,
+        ranges: Iterable[HostRange],
+        chunk_size: int = 300,
+        seed: int = None,
+        position: int = 0,
+        stop: int = None,
+    ):
+        self._ranges = list(ranges)
+        self._ends = list(
+            itertools.accumulate(item.num_addresses for item in self._ranges)
+        )
+        self.total = self._ends[-1] if self._ends else 0
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.position = position
+        self.stop = self.size if stop is None else min(stop, self.size)
+
+    def __len__(self):
+        return self.total
+
+    @property
+    def size(self) -> int:
+        """
+        Длина нумерации курсора position.
+        """
+        if self.seed is None:
+            return self.total
+        return 1 << self._bits
+
+    @property
+    def _bits(self) -> int:
+        return max(self.total - 1, 1).bit_length()
+
+    @property
+    def ranges(self) -> List[HostRange]:
+        return list(self._ranges)
+
+    def address_at(self, index: int) -> int:
+        """
+        Адрес по номеру в общей нумерации диапазонов.
+        """
+        i = bisect_right(self._ends, index)
+        start = self._ends[i - 1] if i else 0
+        return self._ranges[i].first + index - start
+
+    def _sequential(self) -> Iterator[int]:
+        i = bisect_right(self._ends, self.position)
+        offset = self.position - (self._ends[i - 1] if i else 0)
+        for item in self._ranges[i:]:
+            yield from range(item.first + offset, item.last + 1)
+            offset = 0
+
+    @staticmethod
+    def _jump(
+        multiplier: int, increment: int, mask: int, steps: int
+    ) -> Tuple[int, int]:
+        """
+        Шаг LCG x -> a * x + c, повторенный steps раз, как (a, c):
+        композиция аффинных шагов возведением в квадрат.
+        """
+        total_multiplier, total_increment = 1, 0
+        while steps:
+            if steps & 1:
+                total_multiplier = total_multiplier * multiplier & mask
+                total_increment = (
+                    total_increment * multiplier + increment
+                ) & mask
+            increment = (multiplier + 1) * increment & mask
+            multiplier = multiplier * multiplier & mask
+            steps >>= 1
+        return total_multiplier, total_increment
+
+    def _permuted(self) -> Iterator[Optional[int]]:
+        """
+        Адрес на каждом шаге LCG начиная с position, None - номер вне
+        диапазона.
+        """
+        mask = (1 << self._bits) - 1
+        multiplier = (0x5851F42D4C957F2D ^ (self.seed << 2)) & mask & ~3 | 1
+        increment = (2 * self.seed + 1) & mask
+        jump_multiplier, jump_increment = self._jump(
+            multiplier, increment, mask, self.position
+        )
+        value = (self.seed * jump_multiplier + jump_increment) & mask
+        address_at = self.address_at
+        total = self.total
+        for _ in range(self.position, mask + 1):
+            value = (value * multiplier + increment) & mask
+            yield address_at(value) if value < total else None
+
+    def __iter__(self) -> Iterator[List[int]]:
+        if self.seed is None:
+            addresses = self._sequential()
+        else:
+            addresses = self._permuted()
+        while self.position < self.stop:
+            size = min(self.chunk_size, self.stop - self.position)
+            chunk = list(itertools.islice(addresses, size))
+            if not chunk:
+                break
+            self.position += len(chunk)
+            if self.seed is not None:
+                chunk = [address for address in chunk if address is not None]
+                if not chunk:
+                    continue
+            yield chunk
@@ -1,34 +1,38 @@
 import asyncio
-import itertools
 import logging
 import logging.config
+import time
 from datetime import datetime
 from ipaddress import (
     IPv4Address,
     IPv4Interface,
     IPv4Network,
+    ip_address,
     ip_network,
-    summarize_address_range,
 )
-from typing import List, Union
+from typing import AsyncIterator, Dict, Iterable, List, Tuple, Union
 
-import arpreq
 import netifaces
 from aiodns import DNSResolver
-from aiodns.error import DNSError
-from icmplib import async_multiping
+from aiodns.error import ARES_ETIMEOUT, DNSError
+from log_settings.handlers import SAMPLED
 from log_settings.settings import LoggingContext, logger_config
-from mac_vendor_lookup import (
-    AsyncMacLookup,
-    InvalidMacError,
-    MacLookup,
-    VendorNotFoundError,
-)
 from utils import utils
 
+from . import metrics, settings, vendors
+from .arp import ArpEngine, local_links
+from .chunk import DeviceChunk
+from .dns_cache import HostnameCache
+from .neighbors import NeighborTable
+from .ping import PingEngine
+from .pipeline import Pipeline
+from .ranges import AddressStream, HostRange, RangeSet
+
 logging.config.dictConfig(logger_config)
 logger = logging.getLogger("scanner")
 
+STAGE_LIMITS = {"ping": 200, "dns": 100}
+
 
 class Devices:
     """
@@ -40,7 +44,28 @@ class Devices:
     Параметры
         exclude - список интерфейсов, по сетям которых не стоит искать.
         subs - список подсетей по которым стоит искать.
-        chunk_size - размер возвращаемого словаря каждой итерации.
+        exclude_subs - список подсетей, исключаемых из поиска.
+        chunk_size - размер порции (chunk.DeviceChunk) каждой итерации.
+        seed - зерно псевдослучайного порядка опроса адресов.
+        span - номера адресов [start, stop), которые нужно пройти.
+        queue_size - размер очередей между этапами конвейера.
+        limits - ограничения параллелизма этапов, например {"dns": 50}.
+        arp_max_age - время жизни снимка arp-кэша в секундах.
+        dns_cache - кэш имен хостов (dns_cache.HostnameCache).
+        ping_engine - движок icmp-опроса (ping.PingEngine).
+        neighbors - снимок arp-кэша (neighbors.NeighborTable).
+        probe_mode - icmp или arp: адреса on-link сетей опрашиваются
+            запросами ARP, mac берется из ответа (arp.ArpEngine),
+            по умолчанию settings.PROBE_MODE.
+        arp_engine - готовый движок опроса ARP (arp.ArpEngine).
+        resolver - dns-резолвер с интерфейсом aiodns.DNSResolver.query.
+        vendor_index - индекс вендоров (vendors.OUIIndex).
+        ping_engine, neighbors, resolver и vendor_index позволяют подменить
+            сеть и системные вызовы (см. benchmarks.simulation).
+        budget - бюджет памяти (budget.MemoryBudget): этап пинга ждет, пока
+            устройства предыдущих порций не будут записаны в БД.
+        networks - готовый список подсетей (ranges.HostRange), вместо
+            exclude и subs.
         Если ничего не указано, то поиск по интерфейсам.
         Если только subs, то по подсетям из списка subs.
         Если только exclude, то по интерфейсам, не входящих в список exclude.
@@ -52,44 +77,189 @@ class Devices:
     """
 
     def __init__(self, *args, **kwargs):
-        _subs_ifaces = self._get_ifaces_subs(kwargs.get("exclude", None))
-        _subs = self._get_subs_custom(kwargs.get("subs", None))
-        _subs_intersect = self._get_subs_intersect(_subs_ifaces + _subs)
-        _chunk_size = kwargs.get("chunk_size", 300)
-        self._alives_gen = Scan.get_alives_gen(_subs_intersect, _chunk_size)
+        self._networks = kwargs.get("networks")
+        if self._networks is None:
+            self._networks = self.get_networks(
+                kwargs.get("exclude", None),
+                kwargs.get("subs", None),
+                kwargs.get("exclude_subs", None),
+            )
+        self._chunk_size = kwargs.get("chunk_size", 300)
+        self._seed = kwargs.get("seed", None)
+        self._span = kwargs.get("span", (0, None))
+        self._queue_size = kwargs.get("queue_size", 2)
+        self._limits = {**STAGE_LIMITS, **kwargs.get("limits", {})}
+        self._ping = kwargs.get("ping_engine") or PingEngine(
+            concurrency=self._limits["ping"]
+        )
+        self._neighbors = kwargs.get("neighbors") or NeighborTable(
+            max_age=kwargs.get("arp_max_age", 0)
+        )
+        self._arp = kwargs.get("arp_engine")
+        self._owns_arp = False
+        if self._arp is None and (
+            kwargs.get("probe_mode", settings.PROBE_MODE) == "arp"
+        ):
+            self._arp = ArpEngine(
+                local_links(kwargs.get("exclude", None)),
+                fallback=self._ping,
+                rate=settings.ARP_RATE,
+            )
+            self._owns_arp = True
+        if self._arp is not None and self._arp.neighbors is None:
+            self._arp.neighbors = self._neighbors
+        self._dns_cache = kwargs.get("dns_cache") or HostnameCache(
+            maxsize=settings.DNS_CACHE_SIZE,
+            negative_ttl=settings.DNS_NEGATIVE_TTL,
+            path=settings.DNS_CACHE_PATH,
+        )
+        self._resolver = kwargs.get("resolver")
+        self._vendors = kwargs.get("vendor_index")
+        self._budget = kwargs.get("budget")
+        self.stream = AddressStream(
+            self._networks, self._chunk_size, self._seed, *self._span
+        )
+        self._pipeline = None
+        self._loop = None
 
-    def next_chunk(self) -> List[dict]:
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> DeviceChunk:
         """
         Возвращает следующую порцию устройств.
+            Все порции обрабатываются в одном цикле событий, резолвер
+            создается один раз на весь проход. Этапы пинга, arp, dns и
+            поиска вендора работают конвейером (см. pipeline.Pipeline).
         """
         logger.debug("Next chunk started.")
-        ips = next(self._alives_gen)
-        macs = Scan.get_macs(ips)
-        hostnames = asyncio.run(Scan.get_hostnames(ips))
-        vendors = asyncio.run(Scan.get_vendors(macs))
-        ips_list = list(map(str, ips))
-        lengths = len(ips_list), len(macs), len(hostnames), len(vendors)
+        if self._pipeline is None:
+            if self._resolver is None:
+                self._resolver = DNSResolver(loop=asyncio.get_running_loop())
+            if self._vendors is None:
+                self._vendors = vendors.get_index()
+            self._pipeline = Pipeline(
+                self._ping_stage(),
+                [
+                    ("arp", self._arp_stage),
+                    ("dns", self._dns_stage),
+                    ("vendor", self._vendor_stage),
+                ],
+                queue_size=self._queue_size,
+                source_name="ping",
+                observer=metrics.observe_stage,
+            )
+        try:
+            chunk = await self._pipeline.__anext__()
+        except StopAsyncIteration:
+            logger.debug("DNS cache stats %s", self._dns_cache.stats())
+            self._dns_cache.save()
+            if self._owns_arp:
+                self._arp.close()
+            raise
         try:
-            utils.check_inequality(*lengths)
+            chunk.check()
         except utils.ListsNotEqualException as e:
             logger.exception(e)
-        devices = utils.to_lists_of_dicts(
-            ip=ips, mac=macs, hostname=hostnames, vendor=vendors
+        return chunk
+
+    async def _ping_stage(self) -> AsyncIterator[DeviceChunk]:
+        alives_gen = Scan.get_alives_gen(
+            self._networks,
+            self._chunk_size,
+            self._arp or self._ping,
+            self._seed,
+            self._span,
+            self.stream,
+        )
+        async for ips in alives_gen:
+            if self._budget is not None:
+                await self._budget.acquire(len(ips))
+            yield DeviceChunk(ips, position=self.stream.position)
+
+    async def _arp_stage(self, chunk: DeviceChunk) -> DeviceChunk:
+        loop = asyncio.get_running_loop()
+        macs = await loop.run_in_executor(
+            None, Scan.get_macs, chunk.addresses(), self._neighbors
+        )
+        chunk.set_macs(macs)
+        return chunk
+
+    async def _dns_stage(self, chunk: DeviceChunk) -> DeviceChunk:
+        chunk.hostnames = await Scan.get_hostnames(
+            chunk.addresses(),
+            self._resolver,
+            self._limits["dns"],
+            self._dns_cache,
         )
-        return devices
+        return chunk
+
+    async def _vendor_stage(self, chunk: DeviceChunk) -> DeviceChunk:
+        chunk.vendors = Scan.get_vendors(chunk.macs, self._vendors)
+        return chunk
+
+    def next_chunk(self) -> DeviceChunk:
+        """
+        Синхронная обертка над __anext__.
+            Цикл событий создается при первом вызове и живет до конца
+            прохода. Не смешивать с async for на одном экземпляре.
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        try:
+            return self._loop.run_until_complete(self.__anext__())
+        except StopAsyncIteration:
+            self._close_loop()
+            raise StopIteration
+
+    def _close_loop(self):
+        self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        self._loop.close()
+        self._loop = None
 
-    def _get_ifaces_subs(self, exclude: List[str] = None) -> List[IPv4Network]:
+    @property
+    def networks(self) -> List[HostRange]:
+        return self._networks
+
+    @property
+    def latencies(self) -> Dict[str, List[float]]:
+        """
+        Время обработки порций этапами конвейера, секунды.
+        """
+        if self._pipeline is None:
+            return {}
+        return self._pipeline.latencies
+
+    @classmethod
+    def get_networks(
+        cls,
+        exclude: List[str] = None,
+        subs: List[str] = None,
+        exclude_subs: List[str] = None,
+    ) -> List[HostRange]:
+        """
+        Получение диапазонов для сканирования по параметрам exclude, subs и
+        exclude_subs.
+        """
+        _subs_ifaces = cls._get_ifaces_subs(exclude)
+        _subs = cls._get_subs_custom(subs)
+        ranges = cls._get_subs_intersect(_subs_ifaces + _subs)
+        if exclude_subs:
+            ranges = Subnets.exclude_ranges(ranges, exclude_subs)
+        return ranges
+
+    def _get_ifaces_subs(exclude: List[str] = None) -> List[HostRange]:
         ifaces = Interfaces.get_interfaces(exclude)
         ifaces_subs = Subnets.get_ranges_from_ifaces(ifaces)
         return ifaces_subs
 
-    def _get_subs_custom(self, subs: List[str] = None) -> List[IPv4Network]:
+    def _get_subs_custom(subs: List[str] = None) -> List[HostRange]:
         ranges = Subnets.get_ranges_from_str(subs) if subs else []
         return ranges
 
     def _get_subs_intersect(
-        self, subs: List[IPv4Network] = None
-    ) -> List[IPv4Network]:
+        subs: List[HostRange] = None,
+    ) -> List[HostRange]:
         return Subnets.get_ranges_from_nets(subs)
 
 
@@ -105,13 +275,13 @@ class Interfaces:
         """
         Получение системных интерфейсов.
         """
-        logger.debug(f"Excluded interfaces {exclude}")
+        logger.debug("Excluded interfaces %s", exclude)
         ifaces = netifaces.interfaces()
         try:
             if not ifaces:
                 raise utils.NoInterfaceFoundException
         except Exception:
-            logger.exception(f"No network interfaces found.")
+            logger.exception("No network interfaces found.")
         if exclude:
             for iface in exclude:
                 ifaces.remove(iface)
@@ -135,165 +305,183 @@ class Interfaces:
 class Subnets:
     """
     Работа с подсетями.
+        Подсети приводятся к диапазонам адресов хостов (ranges.HostRange),
+        пересекающиеся диапазоны объединяются (ranges.RangeSet).
     """
 
     @classmethod
-    def get_ranges_from_str(cls, range_addrs: List[str]) -> List[IPv4Network]:
+    def get_ranges_from_str(
+        cls, range_addrs: List[str], hosts_only: bool = True
+    ) -> List[HostRange]:
         """
         Получение диапазонов, заданных строкой.
         Например,
         Subnets.get_ranges_from_str(['192.168.1.2/28', '192.168.2-3.1-100'])
         """
-        subnetworks = []
-        for range_addr in range_addrs:
-            if "/" in range_addr:
-                subnetworks.extend(
-                    list(ip_network(range_addr, strict=False).subnets())
-                )
-            elif "-" in range_addr:
-                first = []
-                second = []
-                items = range_addr.split(".")
-                for item in items:
-                    if "-" in item:
-                        temp = item.split("-")
-                        first.append(temp[0])
-                        second.append(temp[1])
-                    else:
-                        first.append(item)
-                        second.append(item)
-                first_addr = IPv4Address(".".join(first))
-                second_addr = IPv4Address(".".join(second))
-                summarized = [
-                    ipaddr
-                    for ipaddr in summarize_address_range(
-                        first_addr, second_addr
-                    )
-                ]
-                subnetworks.extend(summarized)
-            else:
-                subnetworks.append(IPv4Network(range_addr))
-        ranges = cls._remove_subnets(subnetworks)
-        return ranges
+        ranges = RangeSet(
+            cls._parse_range(range_addr, hosts_only)
+            for range_addr in range_addrs
+        )
+        return list(ranges)
+
+    def _parse_range(range_addr: str, hosts_only: bool = True) -> HostRange:
+        if "/" in range_addr:
+            network = ip_network(range_addr, strict=False)
+            return HostRange.from_network(network, hosts_only)
+        elif "-" in range_addr:
+            first = []
+            second = []
+            items = range_addr.split(".")
+            for item in items:
+                if "-" in item:
+                    temp = item.split("-")
+                    first.append(temp[0])
+                    second.append(temp[1])
+                else:
+                    first.append(item)
+                    second.append(item)
+            first_addr = IPv4Address(".".join(first))
+            second_addr = IPv4Address(".".join(second))
+            if first_addr > second_addr:
+                # Как ipaddress.summarize_address_range.
+                raise ValueError("last IP address must be greater than first")
+            return HostRange(int(first_addr), int(second_addr))
+        else:
+            address = int(IPv4Address(range_addr))
+            return HostRange(address, address)
 
     @classmethod
     def get_ranges_from_nets(
-        cls, subnetworks: List[IPv4Network]
-    ) -> List[IPv4Network]:
+        cls, subnetworks: List[Union[IPv4Network, HostRange]]
+    ) -> List[HostRange]:
         """
         Получение уникальных диапазонов из списка диапазонов.
         """
-        ranges = cls._remove_subnets(subnetworks)
-        return ranges
-
-    def _remove_subnets(ranges: List[IPv4Network]) -> List[IPv4Network]:
-        networks_combinations = itertools.combinations(ranges, 2)
-        for combination in networks_combinations:
-            if combination[0].subnet_of(combination[1]):
-                try:
-                    ranges.remove(combination[0])
-                except:
-                    pass
-            elif combination[0].supernet_of(combination[1]):
-                try:
-                    ranges.remove(combination[1])
-                except:
-                    pass
-        return ranges
+        ranges = RangeSet(
+            HostRange.from_network(subnetwork)
+            if isinstance(subnetwork, IPv4Network)
+            else subnetwork
+            for subnetwork in subnetworks
+        )
+        return list(ranges)
 
     @classmethod
     def get_ranges_from_ifaces(
         cls, ifaces: List[IPv4Interface]
-    ) -> List[IPv4Network]:
+    ) -> List[HostRange]:
         """
         Получение диапазонов из сетей системных интерфейсов.
         """
         temp_ranges = [IPv4Interface(iface).network for iface in ifaces]
-        ranges = cls._remove_subnets(temp_ranges)
-        return ranges
+        return cls.get_ranges_from_nets(temp_ranges)
 
+    @classmethod
+    def exclude_ranges(
+        cls, ranges: List[HostRange], exclude_subs: List[str]
+    ) -> List[HostRange]:
+        """
+        Исключение из диапазонов подсетей, заданных строкой.
+            Подсети исключаются целиком, вместе с адресом сети и
+            широковещательным адресом.
+        Например,
+        Subnets.exclude_ranges(ranges, ['10.1.2.0/24', '10.1.5.1-100'])
+        """
+        excluded = cls.get_ranges_from_str(exclude_subs, hosts_only=False)
+        return list(RangeSet(ranges).subtract(excluded))
 
-class Scan:
-    def _get_addresses(network: IPv4Network, chunk_size) -> List[IPv4Address]:
-        hosts = network.hosts()
-        while True:
-            try:
-                chunk = itertools.islice(hosts, chunk_size)
-                addresses = tuple(map(lambda addr: str(addr), list(chunk)))
-                if not addresses:
-                    raise StopIteration
-                yield addresses
-            except StopIteration as e:
-                break
-
-    def _arpreq_or_na(host):
-        if mac := arpreq.arpreq(host):
-            return mac
-        else:
-            return "N/A"
 
+class Scan:
     @classmethod
-    def get_macs(cls, hosts: List[IPv4Address]) -> List[str]:
+    def get_macs(
+        cls, hosts: List[str], table: NeighborTable = None
+    ) -> List[str]:
         logger.debug("Get macs started.")
-        macs = map(cls._arpreq_or_na, hosts)
-        return list(macs)
+        if table is None:
+            table = NeighborTable()
+        return table.lookup_many(hosts)
 
-    async def _get_hostname(resolver: DNSResolver, address: IPv4Address) -> str:
+    async def _get_hostname(
+        resolver: DNSResolver, str_ip: str, cache: HostnameCache
+    ) -> str:
+        result = cache.get(str_ip)
+        if result is not None:
+            return result
+        started = time.perf_counter()
         try:
-            str_ip = str(address)
-            temp = await resolver.gethostbyaddr(str_ip)
-            result = temp.name
-        except DNSError:
+            answer = await resolver.query(
+                ip_address(str_ip).reverse_pointer, "PTR"
+            )
+            result = answer.name
+            cache.set(str_ip, result, answer.ttl)
+        except DNSError as e:
             result = "N/A"
+            cache.set_negative(str_ip)
+            reason = "timeout" if e.args[0] == ARES_ETIMEOUT else "error"
+            metrics.DNS_ERRORS.labels(reason).inc()
+            logger.debug("PTR %s failed: %s", str_ip, reason, extra=SAMPLED)
+        metrics.DNS_SECONDS.observe(time.perf_counter() - started)
         return result
 
     @classmethod
-    async def get_hostnames(cls, ips: List[IPv4Address]) -> List[str]:
+    async def get_hostnames(
+        cls,
+        ips: List[str],
+        resolver: DNSResolver = None,
+        limit: int = None,
+        cache: HostnameCache = None,
+    ) -> List[str]:
         logger.debug("Get hostnames.")
-        loop = asyncio.get_running_loop()
-        resolver = DNSResolver(loop=loop)
-        results = await asyncio.gather(
-            *(cls._get_hostname(resolver, ip) for ip in ips)
+        if resolver is None:
+            resolver = DNSResolver(loop=asyncio.get_running_loop())
+        if cache is None:
+            cache = HostnameCache(maxsize=len(ips) or 1)
+        results = await utils.gather_limited(
+            (cls._get_hostname(resolver, ip, cache) for ip in ips), limit
         )
         return results
 
-    async def _are_alive(addresses: List[IPv4Address]) -> List[IPv4Address]:
-        hosts = await async_multiping(
-            addresses, count=1, interval=0.2, concurrent_tasks=200
-        )
-        alive_hosts = list(filter(lambda x: x.is_alive, hosts))
-        addresses = list(map(lambda x: IPv4Address(x.address), alive_hosts))
-        return addresses
+    async def _are_alive(
+        addresses: List[int], engine: PingEngine
+    ) -> List[int]:
+        return await engine.sweep(addresses)
 
     @classmethod
-    def get_alives_gen(
-        cls, networks: List[IPv4Network], chunk_size
-    ) -> List[IPv4Address]:
+    async def get_alives_gen(
+        cls,
+        networks: List[HostRange],
+        chunk_size,
+        engine: PingEngine = None,
+        seed: int = None,
+        span: Tuple[int, int] = (0, None),
+        stream: AddressStream = None,
+    ) -> AsyncIterator[List[int]]:
         """
-        Генератор возвращающий список пигуемых адресов.
+        Асинхронный генератор, возвращающий списки пингуемых адресов
+        (целые числа, см. ranges.format_address).
+            Адреса всех диапазонов проходятся порциями по chunk_size, при
+            заданном seed - в стабильном псевдослучайном порядке. span
+            ограничивает проход номерами адресов [start, stop). Вместо
+            networks, chunk_size, seed и span можно передать готовый stream.
         """
+        if engine is None:
+            engine = PingEngine()
         logger.debug("Get alives generator.")
-        for network in networks:
-            addresses_gen = cls._get_addresses(network, chunk_size)
-            try:
-                addresses_chunk = next(addresses_gen)
-                alives = asyncio.run(
-                    cls._are_alive(addresses_chunk), debug=True
-                )
-                yield alives
-            except:
-                break
-
-    async def _get_vendor(mac: str) -> str:
-        m = AsyncMacLookup()
-        try:
-            vendor = await m.lookup(mac)
-        except (VendorNotFoundError, InvalidMacError, AttributeError):
-            vendor = "N/F"
-        return vendor
+        if stream is None:
+            stream = AddressStream(networks, chunk_size, seed, *span)
+        for addresses_chunk in stream:
+            alives = await cls._are_alive(addresses_chunk, engine)
+            yield alives
 
     @classmethod
-    async def get_vendors(cls, macs: List[str]) -> List[str]:
+    def get_vendors(
+        cls, macs: Iterable[int], index: vendors.OUIIndex = None
+    ) -> List[str]:
+        """
+        Вендоры по mac-адресам в виде 48-битных чисел (chunk.DeviceChunk).
+        """
         logger.debug("Get vendors.")
-        results = list(map(cls._get_vendor, macs))
-        return await asyncio.gather(*results)
+        if index is None:
+            index = vendors.get_index()
+        names = index.lookup_values(macs)
+        metrics.VENDOR_MISSES.inc(names.count(vendors.NOT_FOUND))
+        return names
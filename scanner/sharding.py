@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from typing import List, Optional, Tuple
+
+from . import settings
+from .chunk import DeviceChunk
+from .dns_cache import HostnameCache
+from .ping import PingEngine
+from .ranges import AddressStream, HostRange
+from .scanner import STAGE_LIMITS, Devices
+
+logger = logging.getLogger("scanner")
+
+_worker_state = {}
+
+
+def _init_worker(options: dict, dns_entries: dict):
+    _worker_state["loop"] = asyncio.new_event_loop()
+    limits = {**STAGE_LIMITS, **options.get("limits", {})}
+    # Кэш имен без файла: записи процессов объединяет и сохраняет
+    # ShardedDevices.
+    dns_cache = HostnameCache(
+        maxsize=settings.DNS_CACHE_SIZE,
+        negative_ttl=settings.DNS_NEGATIVE_TTL,
+    )
+    dns_cache.update(dns_entries)
+    _worker_state["options"] = {
+        "ping_engine": PingEngine(concurrency=limits["ping"]),
+        "dns_cache": dns_cache,
+        **options,
+    }
+
+
+async def _collect(devices: Devices) -> List[DeviceChunk]:
+    return [chunk async for chunk in devices]
+
+
+def _scan_unit(span: Tuple[int, int]) -> Tuple[List[DeviceChunk], dict]:
+    options = _worker_state["options"]
+    devices = Devices(span=span, **options)
+    chunks = _worker_state["loop"].run_until_complete(_collect(devices))
+    return chunks, options["dns_cache"].changes()
+
+
+class ShardedDevices:
+    """
+    Поиск активных устройств в несколько процессов.
+        Нумерация адресов (ranges.AddressStream) делится на части по
+        chunk_size * unit_chunks адресов, части сканируются пулом процессов
+        (по одному циклу событий на процесс). Порции возвращаются в том же
+        порядке и того же размера, что и у Devices. Кэш имен хостов
+        читается из файла один раз, новые записи процессов объединяются и
+        сохраняются в конце сканирования.
+    Параметры
+        workers - число процессов, по умолчанию число ядер.
+        unit_chunks - размер части в порциях.
+        остальные параметры как у Devices.
+    Пример
+        devices = ShardedDevices(subs=['10.0.0.0/16'], workers=8)
+        devices.next_chunk()
+    """
+
+    def __init__(self, workers: int = None, unit_chunks: int = 16, **kwargs):
+        self._workers = workers or os.cpu_count()
+        chunk_size = kwargs.get("chunk_size", 300)
+        networks = Devices.get_networks(
+            kwargs.get("exclude", None),
+            kwargs.get("subs", None),
+            kwargs.get("exclude_subs", None),
+        )
+        unit_size = chunk_size * unit_chunks
+        size = AddressStream(networks, seed=kwargs.get("seed")).size
+        self._units = [
+            (start, start + unit_size) for start in range(0, size, unit_size)
+        ]
+        self._options = {
+            key: kwargs[key]
+            for key in (
+                "chunk_size",
+                "seed",
+                "queue_size",
+                "limits",
+                "arp_max_age",
+            )
+            if key in kwargs
+        }
+        self._options["networks"] = networks
+        self._dns_cache = HostnameCache(
+            maxsize=settings.DNS_CACHE_SIZE,
+            negative_ttl=settings.DNS_NEGATIVE_TTL,
+            path=settings.DNS_CACHE_PATH,
+        )
+        self._pool = None
+        self._results = None
+        self._chunks = iter(())
+
+    @property
+    def networks(self) -> List[HostRange]:
+        return self._options["networks"]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> DeviceChunk:
+        loop = asyncio.get_running_loop()
+        chunk = await loop.run_in_executor(None, self._next_or_none)
+        if chunk is None:
+            raise StopAsyncIteration
+        return chunk
+
+    def _next_or_none(self) -> Optional[DeviceChunk]:
+        try:
+            return self.next_chunk()
+        except StopIteration:
+            return None
+
+    def next_chunk(self) -> DeviceChunk:
+        if self._results is None:
+            logger.debug(
+                "Sharded scan: %s units, %s workers",
+                len(self._units),
+                self._workers,
+            )
+            self._pool = multiprocessing.Pool(
+                self._workers,
+                _init_worker,
+                (self._options, self._dns_cache.entries()),
+            )
+            self._results = self._pool.imap(_scan_unit, self._units)
+        while True:
+            chunk = next(self._chunks, None)
+            if chunk is not None:
+                return chunk
+            try:
+                chunks, dns_entries = next(self._results)
+            except StopIteration:
+                self._dns_cache.save()
+                self.close(wait=True)
+                raise
+            self._dns_cache.update(dns_entries)
+            self._chunks = iter(chunks)
+
+    def close(self, wait: bool = False):
+        """
+        Остановка пула. С wait процессы завершаются сами и успевают
+        дописать журнал (log_settings.handlers.QueueListenerHandler).
+        """
+        if self._pool is not None:
+            if wait:
+                self._pool.close()
+            else:
+                self._pool.terminate()
+            self._pool.join()
+            self._pool = None
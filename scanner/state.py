@@ -0,0 +1,183 @@
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from . import settings, vendors
+from .arp import ArpEngine, local_links
+from .budget import MemoryBudget
+from .dns_cache import HostnameCache
+from .hotset import DarkBlocks, HotSet
+from .neighbors import NeighborTable
+from .ping import PingEngine
+from .ranges import HostRange
+from .scanner import STAGE_LIMITS, Devices
+
+logger = logging.getLogger("scanner")
+
+DEFAULT_TRIGGER = {"trigger": "cron", "minute": "*/1"}
+
+
+class Schedule(NamedTuple):
+    """
+    Расписание сканирования группы сетей.
+        trigger - параметры триггера APScheduler, например
+            {"trigger": "interval", "minutes": 10}.
+        options - параметры Devices: exclude, subs, exclude_subs, chunk_size,
+            seed, limits; mode - "full" (полный проход, по умолчанию) или
+            "hot" (опрос только недавно активных адресов).
+    """
+
+    name: str
+    trigger: dict
+    options: dict
+
+    @classmethod
+    def from_dict(cls, item: dict) -> "Schedule":
+        item = dict(item)
+        name = item.pop("name")
+        trigger = item.pop("trigger", None) or DEFAULT_TRIGGER
+        if isinstance(trigger, str):
+            trigger = {"trigger": trigger}
+        return cls(name, trigger, item)
+
+    @property
+    def mode(self) -> str:
+        return self.options.get("mode", "full")
+
+
+def load_schedules(path: str = None) -> List[Schedule]:
+    """
+    Чтение расписаний из json-файла со списком объектов вида
+        {"name": "office", "subs": ["10.1.0.0/24"],
+         "trigger": {"trigger": "interval", "minutes": 5}}
+    Без файла - одно расписание "default" по сетям интерфейсов раз в минуту.
+    """
+    if not path:
+        return [Schedule("default", DEFAULT_TRIGGER, {})]
+    with open(path) as f:
+        return [Schedule.from_dict(item) for item in json.load(f)]
+
+
+class ScanState:
+    """
+    Состояние сканера, сохраняемое между проходами.
+        Индекс вендоров, кэш имен хостов, снимок arp-кэша, оценки RTT
+        движка пинга и нормализованные диапазоны расписаний создаются один
+        раз и переиспользуются каждым проходом. Диапазоны пересчитываются,
+        если они старше networks_max_age секунд (сети интерфейсов могут
+        измениться).
+        hot - недавно активные адреса (hotset.HotSet) для частого опроса,
+        dark - отсрочка опроса блоков без ответов (hotset.DarkBlocks).
+        probe_engine - движок опроса проходов и hot: при probe_mode arp
+        это общий arp.ArpEngine, иначе ping_engine, поэтому hot
+        опрашивается тем же способом, которым адреса найдены (хосты без
+        icmp не пропадают).
+    Пример
+        state = ScanState()
+        devices = state.devices(schedule)
+        ...
+        state.record_sweep(devices.networks, alive_ips)
+        dropped, returned = await state.probe_hot()
+    """
+
+    def __init__(
+        self,
+        networks_max_age: float = settings.NETWORKS_MAX_AGE,
+        arp_max_age: float = 0,
+        limits: dict = None,
+        probe_mode: str = settings.PROBE_MODE,
+    ):
+        self.networks_max_age = networks_max_age
+        self.limits = {**STAGE_LIMITS, **(limits or {})}
+        self.ping_engine = PingEngine(concurrency=self.limits["ping"])
+        self.dns_cache = HostnameCache(
+            maxsize=settings.DNS_CACHE_SIZE,
+            negative_ttl=settings.DNS_NEGATIVE_TTL,
+            path=settings.DNS_CACHE_PATH,
+        )
+        self.neighbors = NeighborTable(max_age=arp_max_age)
+        self.probe_mode = probe_mode
+        self.arp_engine = None
+        if probe_mode == "arp":
+            self.arp_engine = ArpEngine(
+                local_links(),
+                fallback=self.ping_engine,
+                neighbors=self.neighbors,
+                rate=settings.ARP_RATE,
+            )
+        self.vendors = vendors.get_index()
+        self.hot = HotSet(max_misses=settings.HOT_MAX_MISSES)
+        self.dark = DarkBlocks(
+            dark_after=settings.DARK_AFTER,
+            max_backoff=settings.DARK_MAX_BACKOFF,
+        )
+        self._networks: Dict[str, tuple] = {}
+
+    @property
+    def probe_engine(self):
+        return self.arp_engine or self.ping_engine
+
+    def networks(self, schedule: Schedule) -> List[HostRange]:
+        cached = self._networks.get(schedule.name)
+        now = time.monotonic()
+        if cached is not None and now - cached[0] < self.networks_max_age:
+            return cached[1]
+        networks = Devices.get_networks(
+            schedule.options.get("exclude"),
+            schedule.options.get("subs"),
+            schedule.options.get("exclude_subs"),
+        )
+        logger.debug(
+            "Networks of %s refreshed: %s ranges", schedule.name, len(networks)
+        )
+        self._networks[schedule.name] = (now, networks)
+        return networks
+
+    def devices(
+        self, schedule: Schedule, budget: MemoryBudget = None
+    ) -> Devices:
+        """
+        Проход по сетям расписания с общим теплым состоянием.
+            Блоки, опрос которых отложен (dark), в проход не входят.
+            budget - бюджет памяти прохода (budget.MemoryBudget).
+        """
+        options = {
+            key: value
+            for key, value in schedule.options.items()
+            if key in ("chunk_size", "seed", "queue_size", "limits")
+        }
+        return Devices(
+            networks=self.dark.active(self.networks(schedule)),
+            ping_engine=self.ping_engine,
+            probe_mode=self.probe_mode,
+            arp_engine=self.arp_engine,
+            dns_cache=self.dns_cache,
+            neighbors=self.neighbors,
+            vendor_index=self.vendors,
+            budget=budget,
+            **options,
+        )
+
+    def record_sweep(self, networks: List[HostRange], ips: Iterable[int]):
+        """
+        Учет результатов полного прохода по диапазонам networks.
+            Ответившие адреса добавляются в hot, блоки без ответов получают
+            отсрочку.
+        """
+        alives = list(ips)
+        self.hot.add_many(alives)
+        self.dark.record(networks, alives)
+
+    def close(self):
+        if self.arp_engine is not None:
+            self.arp_engine.close()
+
+    async def probe_hot(self) -> Tuple[List[int], List[int]]:
+        """
+        Опрос недавно активных адресов.
+            Возвращает пропавшие и вернувшиеся адреса.
+        """
+        addresses = self.hot.addresses
+        alives = await self.probe_engine.sweep(addresses) if addresses else []
+        return self.hot.update(addresses, alives)
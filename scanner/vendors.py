@@ -0,0 +1,111 @@
+import logging
+import os
+import sys
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+from mac_vendor_lookup import BaseMacLookup, MacLookup
+
+logger = logging.getLogger("scanner")
+
+NOT_FOUND = "N/F"
+# Длины префиксов реестров IEEE (MA-L, MA-M, MA-S) в шестнадцатеричных
+# символах и соответствующий сдвиг 48-битного mac-адреса.
+_PREFIX_SHIFTS = {9: 48 - 36, 7: 48 - 28, 6: 48 - 24}
+
+
+class OUIIndex:
+    """
+    Индекс вендоров по префиксам mac-адресов.
+        Файл вендоров разбирается один раз, префиксы хранятся как целые
+        числа в словарях по длине префикса (24, 28 и 36 бит). Поиск
+        выполняется без ввода-вывода, от самого длинного префикса к
+        самому короткому.
+    Пример
+        index = OUIIndex.from_file()
+        index.lookup("00:1a:2b:3c:4d:5e")
+    """
+
+    def __init__(self, prefixes: Dict[int, Dict[int, str]] = None):
+        self._prefixes = prefixes or {}
+        self._shifts = sorted(self._prefixes)
+
+    def __len__(self):
+        return sum(map(len, self._prefixes.values()))
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[bytes]) -> "OUIIndex":
+        """
+        Построение индекса из строк вида b"001A2B:Vendor".
+        """
+        prefixes = {}
+        for line in lines:
+            prefix, sep, vendor = line.partition(b":")
+            shift = _PREFIX_SHIFTS.get(len(prefix))
+            if not sep or shift is None:
+                continue
+            try:
+                key = int(prefix, 16)
+            except ValueError:
+                continue
+            name = sys.intern(vendor.strip().decode("utf8", "replace"))
+            prefixes.setdefault(shift, {})[key] = name
+        return cls(prefixes)
+
+    @classmethod
+    def from_file(cls, path: str = None) -> "OUIIndex":
+        """
+        Построение индекса из файла вендоров mac_vendor_lookup.
+            Если файла нет, он скачивается.
+        """
+        path = path or BaseMacLookup.cache_path
+        if not os.path.exists(path):
+            logger.debug("Vendors file %s not found, downloading.", path)
+            MacLookup().update_vendors()
+        with open(path, "rb") as f:
+            index = cls.from_lines(f)
+        logger.debug("Vendors index loaded: %s prefixes.", len(index))
+        return index
+
+    @staticmethod
+    def mac_to_int(mac: str) -> int:
+        digits = mac.replace(":", "").replace("-", "").replace(".", "")
+        if len(digits) != 12:
+            raise ValueError(mac)
+        return int(digits, 16)
+
+    def lookup(self, mac: str) -> str:
+        """
+        Возвращает имя вендора или NOT_FOUND.
+        """
+        try:
+            value = self.mac_to_int(mac)
+        except (ValueError, AttributeError):
+            return NOT_FOUND
+        return self.lookup_value(value)
+
+    def lookup_value(self, value: int) -> str:
+        """
+        Поиск по mac-адресу в виде 48-битного числа.
+        """
+        for shift in self._shifts:
+            vendor = self._prefixes[shift].get(value >> shift)
+            if vendor is not None:
+                return vendor
+        return NOT_FOUND
+
+    def lookup_many(self, macs: Iterable[str]) -> List[str]:
+        lookup = self.lookup
+        return [lookup(mac) for mac in macs]
+
+    def lookup_values(self, values: Iterable[int]) -> List[str]:
+        lookup = self.lookup_value
+        return [lookup(value) for value in values]
+
+
+@lru_cache(maxsize=None)
+def get_index(path: str = None) -> OUIIndex:
+    """
+    Индекс вендоров, общий для всего процесса.
+    """
+    return OUIIndex.from_file(path)
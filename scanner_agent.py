@@ -0,0 +1,28 @@
+import argparse
+import logging
+import logging.config
+
+from prometheus_client import start_http_server
+
+from log_settings.settings import logger_config
+from scanner import settings
+from scanner.distributed import ScanAgent
+
+logging.config.dictConfig(logger_config)
+logger = logging.getLogger("scanner")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--broker", default=settings.BROKER_URL)
+    parser.add_argument("--name", default=None)
+    parser.add_argument("--arp-max-age", type=float, default=0)
+    parser.add_argument("--metrics-port", type=int, default=None)
+    args = parser.parse_args()
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+    agent = ScanAgent(args.broker, args.name, arp_max_age=args.arp_max_age)
+    try:
+        agent.run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import logging
+import logging.config
+import time
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List
+
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from prometheus_client import Gauge, start_http_server
+
+import retention_run
+import scanner_run
+from db import hotset
+from db.settings import async_database
+from log_settings.settings import logger_config
+from scanner import settings
+from scanner.budget import MemoryBudget
+from scanner.chunk import DeviceChunk
+from scanner.state import ScanState, Schedule, load_schedules
+
+logging.config.dictConfig(logger_config)
+logger = logging.getLogger("scheduler")
+
+RUN_SECONDS = Gauge(
+    "netscan_run_seconds", "Duration of the last run", ["schedule"]
+)
+RUN_DEVICES = Gauge(
+    "netscan_run_devices", "Devices found by the last run", ["schedule"]
+)
+SKIPPED_TICKS = Gauge(
+    "netscan_skipped_ticks",
+    "Ticks skipped while a run was active",
+    ["schedule"],
+)
+HOT_SET_SIZE = Gauge("netscan_hot_set_size", "Addresses in the hot set")
+
+
+class ScanDaemon:
+    """
+    Долгоживущий процесс сканирования.
+        Вместо запуска сканирования с нуля на каждый тик планировщика
+        состояние сканера (scanner.state.ScanState) живет все время работы
+        процесса. Каждое расписание - отдельная задача APScheduler; пока
+        проход расписания не закончен, следующие тики пропускаются
+        (max_instances=1), пропущенные тики объединяются в один
+        (coalesce=True). Время, число устройств и пропуски последнего
+        прохода каждого расписания хранятся в runs и публикуются вместе с
+        метриками этапов (scanner.metrics) на /metrics.
+        Расписания с mode="hot" опрашивают только недавно активные адреса
+        (ScanState.hot) без записи в БД и с частым триггером - пропажа
+        устройства видна за время одного такого опроса. Полные проходы
+        пополняют hot и откладывают опрос "темных" блоков.
+    Пример
+        daemon = ScanDaemon(load_schedules("schedules.json"))
+        await daemon.load_hot_set()
+        daemon.start()
+        asyncio.get_event_loop().run_forever()
+    """
+
+    def __init__(
+        self,
+        schedules: List[Schedule],
+        state: ScanState = None,
+        copy: bool = False,
+    ):
+        self.schedules = schedules
+        self.state = state or ScanState()
+        self.copy = copy
+        self.runs = {}
+        self.skipped = Counter()
+        self.scheduler = AsyncIOScheduler(
+            job_defaults={"max_instances": 1, "coalesce": True}
+        )
+        self.scheduler.add_listener(self._on_skipped, EVENT_JOB_MAX_INSTANCES)
+
+    async def load_hot_set(self, hours: float = settings.HOT_WINDOW_HOURS):
+        """
+        Заполнение hot адресами из сканирований за последние hours часов.
+        """
+        since = datetime.now() - timedelta(hours=hours)
+        async with async_database.engine.connect() as conn:
+            addresses = await conn.run_sync(hotset.recent_addresses, since)
+        self.state.hot.add_many(addresses)
+        logger.info("Hot set loaded: %s addresses", len(self.state.hot))
+
+    async def _collected(
+        self, devices: AsyncIterator, ips: array
+    ) -> AsyncIterator[DeviceChunk]:
+        async for chunk in devices:
+            ips.extend(chunk.ips)
+            yield chunk
+
+    async def _run_full(self, run: dict, schedule: Schedule):
+        budget = None
+        if settings.MEMORY_BUDGET:
+            budget = MemoryBudget(int(settings.MEMORY_BUDGET * 2**20))
+        devices = self.state.devices(schedule, budget)
+        ips = array("I")
+        run["scan_id"] = await scanner_run.ascan_and_commit(
+            starter="scheduler",
+            copy=self.copy,
+            devices=self._collected(devices, ips),
+            budget=budget,
+        )
+        run["devices"] = len(ips)
+        self.state.record_sweep(devices.networks, ips)
+
+    async def _run_hot(self, run: dict, schedule: Schedule):
+        run["scan_id"] = None
+        run["devices"] = len(self.state.hot)
+        dropped, returned = await self.state.probe_hot()
+        run["dropped"] = len(dropped)
+        run["returned"] = len(returned)
+
+    async def run_schedule(self, schedule: Schedule) -> dict:
+        """
+        Один проход расписания: полный с записью в БД или опрос hot.
+        """
+        run = {"start": datetime.now(), "mode": schedule.mode}
+        started = time.perf_counter()
+        if schedule.mode == "hot":
+            await self._run_hot(run, schedule)
+        else:
+            await self._run_full(run, schedule)
+        run["duration"] = time.perf_counter() - started
+        run["probes_per_second"] = self.state.probe_engine.probes_per_second
+        run["skipped"] = self.skipped[schedule.name]
+        self.runs[schedule.name] = run
+        RUN_SECONDS.labels(schedule.name).set(run["duration"])
+        RUN_DEVICES.labels(schedule.name).set(run["devices"])
+        HOT_SET_SIZE.set(len(self.state.hot))
+        logger.info(
+            "Scan %s (%s) of %s finished in %.1f s, %s devices",
+            run["scan_id"],
+            schedule.mode,
+            schedule.name,
+            run["duration"],
+            run["devices"],
+        )
+        return run
+
+    def _on_skipped(self, event):
+        self.skipped[event.job_id] += 1
+        SKIPPED_TICKS.labels(event.job_id).set(self.skipped[event.job_id])
+        logger.warning(
+            "Scan of %s is still running, tick skipped.", event.job_id
+        )
+
+    def start(self):
+        for schedule in self.schedules:
+            trigger = dict(schedule.trigger)
+            self.scheduler.add_job(
+                self.run_schedule,
+                trigger.pop("trigger"),
+                args=(schedule,),
+                id=schedule.name,
+                name=schedule.name,
+                **trigger,
+            )
+        self.scheduler.add_job(
+            retention_run.drop_old_partitions, "cron", hour=3, id="retention"
+        )
+        self.scheduler.start()
+        logger.info(
+            "Scan daemon started with schedules %s",
+            [schedule.name for schedule in self.schedules],
+        )
+
+    def shutdown(self):
+        self.scheduler.shutdown(wait=False)
+        self.state.dns_cache.save()
+        self.state.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schedules", default=settings.SCHEDULES_PATH)
+    parser.add_argument("--copy", action="store_true")
+    parser.add_argument(
+        "--metrics-port", type=int, default=settings.METRICS_PORT
+    )
+    args = parser.parse_args()
+    start_http_server(args.metrics_port)
+    loop = asyncio.get_event_loop()
+    daemon = ScanDaemon(load_schedules(args.schedules), copy=args.copy)
+    loop.run_until_complete(daemon.load_hot_set())
+    daemon.start()
+    try:
+        loop.run_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        daemon.shutdown()
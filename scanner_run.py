@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import logging
 import logging.config
@@ -5,66 +6,146 @@ import sys
 import typing
 from datetime import datetime
 
-import sqlalchemy.orm as orm
-
 import scanner
-from db import models
-from db.settings import database as db
+from db import checkpoints
+from db.inventory import Inventory
+from db.settings import async_database
+from db.writer import ScanWriter
 from log_settings.settings import logger_config
-from scanner import scanner
+from scanner import scanner, settings, sharding
+from scanner.budget import MemoryBudget, peak_rss
+from scanner.distributed import Coordinator
+from scanner.ranges import HostRange
 
 logging.config.dictConfig(logger_config)
 logger = logging.getLogger("scanner")
 
 
-def scan_and_commit(starter: str = "manual"):
+async def ascan_and_commit(
+    starter: str = "manual",
+    sharded: bool = False,
+    workers: int = None,
+    incremental: bool = False,
+    inventory: Inventory = None,
+    copy: bool = False,
+    devices: typing.AsyncIterator = None,
+    writer: ScanWriter = None,
+    memory_budget: float = settings.MEMORY_BUDGET,
+    budget: MemoryBudget = None,
+    resume: bool = False,
+    distributed: bool = False,
+    subs: typing.List[str] = None,
+) -> int:
     """
-    Скрипт запуска сканирования и записи результатов в БД.
-    В базу устройства записываются порциями.
+    Сканирование и запись результатов в БД.
+    В базу устройства записываются порциями через ScanWriter, запись порции
+    идет одновременно с опросом следующей.
+    При sharded=True сканирование выполняется в workers процессов.
+    При incremental=True вместо полного снимка в device записываются только
+    изменения (см. db.inventory.Inventory).
+    При copy=True устройства пишутся через COPY (см. db.ingest), при ошибке
+    COPY порция записывается через ORM.
+    devices - готовый источник порций (например, из scanner.state.ScanState).
+    writer - готовый объект записи с интерфейсом ScanWriter.
+    memory_budget - бюджет памяти под устройства в обработке, МиБ (0 - без
+    ограничения): медленная запись в БД замедляет опрос адресов (см.
+    scanner.budget.MemoryBudget). Для готового источника devices бюджет
+    передается в budget, им же должен быть создан источник.
+    Для прохода Devices в БД хранится точка продолжения: курсор адресов
+    записывается вместе с устройствами каждой порции. При resume=True
+    продолжается последнее незавершенное сканирование (с первого
+    незаписанного адреса, под тем же id), если его нет - начинается новое.
+    При distributed=True адреса сканируют агенты на других узлах
+    (scanner_agent.py), результаты пишутся под одним id сканирования (см.
+    scanner.distributed.Coordinator).
+    subs - список подсетей вместо сетей интерфейсов.
+    В конце в журнал пишется пиковый размер памяти процесса (RSS).
+    Возвращает id сканирования.
     """
-    devices_gen = scanner.Devices()
+    local = devices is None and not sharded and not distributed
+    if budget is None and memory_budget and local:
+        budget = MemoryBudget(int(memory_budget * 2**20))
+    checkpoint = None
+    if resume and local:
+        async with async_database.engine.connect() as conn:
+            checkpoint = await conn.run_sync(checkpoints.unfinished)
+        if checkpoint is None:
+            logger.info("No unfinished scan to resume, starting a new one.")
+    if devices is not None:
+        devices_gen = devices
+    elif distributed:
+        devices_gen = Coordinator(subs=subs)
+    elif sharded:
+        devices_gen = sharding.ShardedDevices(workers=workers, subs=subs)
+    elif checkpoint is not None:
+        devices_gen = scanner.Devices(
+            networks=[HostRange(*item) for item in checkpoint.networks],
+            chunk_size=checkpoint.chunk_size,
+            seed=checkpoint.seed,
+            span=(checkpoint.position, None),
+            budget=budget,
+        )
+    else:
+        devices_gen = scanner.Devices(subs=subs, budget=budget)
+    if incremental and inventory is None:
+        inventory = Inventory()
 
-    start_time = datetime.now()
-    logger.debug(f"Scan started at {start_time}")
-    with db.session() as session:
-        scan = models.Scan(start=start_time, starter=starter)
-        session.add(scan)
-        session.commit()
+    if writer is None:
+        writer = ScanWriter(
+            starter=starter,
+            copy=copy,
+            inventory=inventory if incremental else None,
+            checkpoint=getattr(devices_gen, "stream", None),
+            resume=checkpoint,
+            networks=getattr(devices_gen, "networks", None),
+        )
+    if budget is not None:
+        writer.budget = budget
+    scan_id = await writer.start()
+    logger.debug("Scan %s started at %s", scan_id, datetime.now())
+    async for devices in devices_gen:
+        await writer.write(devices)
+    await writer.close()
+    logger.debug("Scan finished at %s, rows %s", datetime.now(), writer.rows)
+    logger.info(
+        "Scan %s: %s rows, peak RSS %.1f MiB",
+        scan_id,
+        writer.rows,
+        peak_rss() / 2**20,
+    )
+    if budget is not None:
+        budget.report()
+    return scan_id
 
-    while True:
-        try:
-            devices = devices_gen.next_chunk()
-        except StopIteration as e:
-            break
 
-        with db.session() as session:
-            scan = (
-                session.query(models.Scan)
-                .order_by(models.Scan.id.desc())
-                .first()
-            )
-            scan_id = scan.id
-            logger.debug(f"Scan id = {scan_id}")
-            devices_bulk = [
-                models.Device(
-                    ip=device["ip"],
-                    mac=device["mac"],
-                    hostname=device["hostname"],
-                    vendor=device["vendor"],
-                    scan_id=scan_id,
-                )
-                for device in devices
-            ]
-            session.bulk_save_objects(devices_bulk)
-            scan.finish = datetime.now()
-            session.add(scan)
-            try:
-                session.commit()
-            except Exception as e:
-                session.rollback()
-                logger.exception()
-    logger.debug(f"Scan finished at {datetime.now()}")
+def scan_and_commit(*args, **kwargs) -> int:
+    """
+    Скрипт запуска сканирования и записи результатов в БД.
+    Синхронная обертка над ascan_and_commit.
+    """
+    return asyncio.run(ascan_and_commit(*args, **kwargs))
 
 
 if __name__ == "__main__":
-    scan_and_commit()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sharded", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--copy", action="store_true")
+    parser.add_argument(
+        "--memory-budget", type=float, default=settings.MEMORY_BUDGET
+    )
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--distributed", action="store_true")
+    parser.add_argument("--subs", nargs="+", default=None)
+    args = parser.parse_args()
+    scan_and_commit(
+        sharded=args.sharded,
+        workers=args.workers,
+        incremental=args.incremental,
+        copy=args.copy,
+        memory_budget=args.memory_budget,
+        resume=args.resume,
+        distributed=args.distributed,
+        subs=args.subs,
+    )
@@ -9,6 +9,7 @@ from datetime import datetime
 from apscheduler.schedulers.blocking import BlockingScheduler
 
 import log_settings
+import retention_run
 import scanner
 import scanner_run
 from log_settings import settings
@@ -18,16 +19,19 @@ logger = logging.getLogger("scheduler")
 
 
 def tick():
-    logger.info(f"Scheduled scan started at {datetime.now()}")
+    logger.info("Scheduled scan started at %s", datetime.now())
     scanner_run.scan_and_commit(starter='scheduler')
 
 
 if __name__ == "__main__":
-    logger.info(f"Running scheduler script {datetime.now()}")
+    logger.info("Running scheduler script %s", datetime.now())
     now = datetime.now()
     local_now = now.astimezone()
     local_tz = local_now.tzinfo
     local_tzname = local_tz.tzname(local_now)
     scheduler = BlockingScheduler()
-    scheduler.add_job(tick, "cron", minute="*/1")
+    scheduler.add_job(
+        tick, "cron", minute="*/1", max_instances=1, coalesce=True
+    )
+    scheduler.add_job(retention_run.drop_old_partitions, "cron", hour=3)
     scheduler.start()
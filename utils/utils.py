@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import logging.config
 
@@ -22,6 +23,25 @@ def to_lists_of_dicts(**kwargs):
 
 
 def check_inequality(*lengths):
-    if sum(lengths) / len(lengths) != lengths[0]:
+    if len(set(lengths)) > 1:
         raise ListsNotEqualException(f"Lengths are {lengths}")
     return True
+
+
+async def gather_limited(aws, limit=None):
+    """
+    asyncio.gather, одновременно выполняющий не более limit корутин.
+        aws читается по мере выполнения, поэтому для генератора корутин
+        одновременно существуют не более limit корутин и задач.
+    """
+    if not limit:
+        return await asyncio.gather(*aws)
+    results = {}
+    aws = enumerate(aws)
+
+    async def _worker():
+        for index, aw in aws:
+            results[index] = await aw
+
+    await asyncio.gather(*(_worker() for _ in range(limit)))
+    return [results[index] for index in range(len(results))]